@@ -0,0 +1,74 @@
+"""Benchmark the datetime feature expansion of the CompetitionDataManager.
+
+Compares the vectorized ``transform_datetime_features`` against the old
+row-wise implementation (``parse_dt`` plus one ``apply`` per feature) and
+reports rows per second for both.
+
+Usage: python benchmarks/bench_datetime_features.py [n_rows ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'lib'))
+
+from autosklearn.data.competition_data_manager import parse_dt, \
+    transform_datetime_features
+
+
+def transform_datetime_features_rowwise(df):
+    datetime_columns = [
+        col_name
+        for col_name in df.columns
+        if col_name.startswith('datetime')
+    ]
+    for col_name in datetime_columns:
+        df[col_name] = df[col_name].apply(lambda x: parse_dt(x))
+        df['number_weekday_{}'.format(col_name)] = df[col_name].apply(lambda x: x.weekday())
+        df['number_month_{}'.format(col_name)] = df[col_name].apply(lambda x: x.month)
+        df['number_day_{}'.format(col_name)] = df[col_name].apply(lambda x: x.day)
+        df['number_hour_{}'.format(col_name)] = df[col_name].apply(lambda x: x.hour)
+        df['number_hour_of_week_{}'.format(col_name)] = df[col_name].apply(lambda x: x.hour + x.weekday() * 24)
+        df['number_minute_of_day_{}'.format(col_name)] = df[col_name].apply(lambda x: x.minute + x.hour * 60)
+    return df
+
+
+def make_frame(n_rows, seed=1):
+    rng = np.random.RandomState(seed)
+    seconds = rng.randint(0, 30 * 365 * 86400, size=n_rows)
+    stamps = (np.datetime64('1990-01-01T00:00:00') +
+              seconds.astype('timedelta64[s]')).astype(str)
+    stamps = np.char.replace(stamps, 'T', ' ').astype(object)
+    # Every third value is a date only, every 50th value is missing
+    stamps[::3] = [s[:10] for s in stamps[::3]]
+    stamps[::50] = None
+    return pd.DataFrame({'datetime_0': stamps})
+
+
+def time_it(function, df):
+    start = time.time()
+    rval = function(df.copy())
+    return time.time() - start, rval
+
+
+def main(sizes):
+    print('%10s %16s %16s %8s' % ('rows', 'row-wise rows/s',
+                                  'vectorized rows/s', 'speedup'))
+    for n_rows in sizes:
+        df = make_frame(n_rows)
+        old_time, old = time_it(transform_datetime_features_rowwise, df)
+        new_time, new = time_it(transform_datetime_features, df)
+        for column in old:
+            pd.testing.assert_series_equal(old[column], new[column],
+                                           check_dtype=False)
+        print('%10d %16.0f %16.0f %8.1f' % (n_rows, n_rows / old_time,
+                                            n_rows / new_time,
+                                            old_time / new_time))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
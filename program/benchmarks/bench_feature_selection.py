@@ -0,0 +1,82 @@
+"""Benchmark logic.project_data_via_feature_selection on wide datasets.
+
+Compares the column-blocked feature selection against the old pipeline
+(``Imputer(strategy='median')`` followed by ``SelectKBest(k=500)`` on the
+whole data), checks that both select the same features and reports the time
+and the peak memory allocated by both.
+
+Usage: python benchmarks/bench_feature_selection.py [n_rows n_features ...]
+"""
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import sklearn.feature_selection
+import sklearn.pipeline
+import sklearn.preprocessing
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'lib'))
+
+import logic
+
+
+def project_data_via_pipeline(X_train, X_test, y_train):
+    imp = sklearn.preprocessing.Imputer(strategy='median')
+    pca = sklearn.feature_selection.SelectKBest(k=500)
+    pipeline = sklearn.pipeline.Pipeline((('imp', imp), ('pca', pca)))
+    pipeline.fit(X_train, y_train)
+    return (pipeline.transform(X_train), pipeline.transform(X_test),
+            pca._get_support_mask())
+
+
+def make_data(n_rows, n_features, seed=1):
+    # float32 like the streaming data manager loads it, with missing values
+    # and a binary target that depends on a few features
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n_rows + n_rows // 4, n_features).astype(np.float32)
+    X[rng.rand(*X.shape) < 0.05] = np.nan
+    y = (np.nan_to_num(X[:n_rows, :10]).sum(axis=1) +
+         rng.randn(n_rows) > 0).astype(np.float64)
+    return X[:n_rows], X[n_rows:], y
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.time()
+    rval = function(*args)
+    duration = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rval, duration, peak / 1024 / 1024
+
+
+def main(sizes):
+    logger = logging.getLogger('bench_feature_selection')
+    warnings.simplefilter('ignore')
+    n_jobs = os.cpu_count() or 1
+
+    print('%8s %8s %10s %10s %10s %10s %8s' % (
+        'rows', 'features', 'old s', 'old MB', 'blocked s', 'blocked MB',
+        'speedup'))
+    for n_rows, n_features in sizes:
+        X_train, X_test, y_train = make_data(n_rows, n_features)
+        old, old_time, old_memory = measure(
+            project_data_via_pipeline, X_train, X_test, y_train)
+        new, new_time, new_memory = measure(
+            lambda: logic.project_data_via_feature_selection(
+                X_train, X_test, y_train, logger, n_jobs=n_jobs))
+        assert np.all(old[2] == new[2])
+        print('%8d %8d %10.2f %10.0f %10.2f %10.0f %8.1f' % (
+            n_rows, n_features, old_time, old_memory, new_time, new_memory,
+            old_time / new_time))
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(list(zip(args[::2], args[1::2])) or
+         [(10000, 2000), (20000, 5000)])
@@ -0,0 +1,93 @@
+"""Benchmark the time it takes to import the modules of the program.
+
+Every module is imported in a fresh interpreter, like the one started by
+run.py. The report has the format of ``python -X importtime`` (which the
+Python version of the vendored extensions doesn't have yet): the time spent
+in each module itself and including its imports, in microseconds, indented
+by import depth. It ends with the modules that take the most time
+themselves and the total.
+
+Usage: python benchmarks/bench_import_time.py [module ...]
+"""
+import builtins
+import importlib
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib')
+N_SLOWEST = 15
+
+
+def profile_import(module):
+    # Only the first import of a module executes it, its time includes the
+    # time of all modules it imports first
+    records = []
+    stack = []
+
+    def get_imported_name(name, globals=None, locals=None, fromlist=(),
+                          level=0):
+        # Returns the name of the module that is not imported yet or None
+        if level > 0:
+            package = globals.get('__package__') or globals['__name__']
+            name = importlib.util.resolve_name('.' * level + name, package)
+        if name not in sys.modules:
+            return name
+        missing = [item for item in fromlist or ()
+                   if item != '*' and not hasattr(sys.modules[name], item)]
+        if missing:
+            return '%s.%s' % (name, ','.join(missing))
+        return None
+
+    def timed(import_function):
+        def wrapper(name, *args, **kwargs):
+            imported_name = get_imported_name(name, *args, **kwargs)
+            if imported_name is None:
+                return import_function(name, *args, **kwargs)
+            record = [imported_name, len(stack), 0.0, 0.0]
+            records.append(record)
+            stack.append(record)
+            start = time.perf_counter()
+            try:
+                return import_function(name, *args, **kwargs)
+            finally:
+                stack.pop()
+                record[3] = time.perf_counter() - start
+                if stack:
+                    stack[-1][2] -= record[3]
+                record[2] += record[3]
+        return wrapper
+
+    builtins.__import__ = timed(builtins.__import__)
+    importlib.import_module = timed(importlib.import_module)
+    start = time.perf_counter()
+    importlib.import_module(module)
+    total = time.perf_counter() - start
+
+    print('import time: self [us] | cumulative | imported package')
+    for name, depth, self_time, cumulative in records:
+        print('import time: %9d | %10d | %s%s' % (
+            self_time * 1e6, cumulative * 1e6, '  ' * depth, name))
+    print()
+    print('%d slowest modules (self time):' % N_SLOWEST)
+    for name, depth, self_time, cumulative in sorted(
+            records, key=lambda record: -record[2])[:N_SLOWEST]:
+        print('%10.3f s  %s' % (self_time, name))
+    print('%10.3f s  total for import %s' % (total, module))
+
+
+def main(modules):
+    for module in modules:
+        subprocess.check_call([sys.executable, os.path.abspath(__file__),
+                               '--child', module])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        # Like run.py, the program's libraries come after site-packages
+        sys.path.append(LIB)
+        profile_import(sys.argv[2])
+    else:
+        main(sys.argv[1:] or ['logic'])
@@ -0,0 +1,80 @@
+"""Benchmark writing ensemble predictions with Backend.save_predictions_as_txt.
+
+Compares the chunked writer against the old implementation (one
+``format`` call and one ``write`` per value), checks that both files are
+byte-identical and reports rows per second for both.
+
+Usage: python benchmarks/bench_save_predictions.py [n_rows ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'lib'))
+
+from autosklearn.util.backend import Backend, BackendContext
+
+
+def save_predictions_as_txt_rowwise(predictions, filepath, precision):
+    format_string = '{:.%dg} ' % precision
+    with open(filepath, 'w') as output_file:
+        for row in predictions:
+            if not isinstance(row, np.ndarray) and not isinstance(row, list):
+                row = [row]
+            for val in row:
+                output_file.write(format_string.format(float(val)))
+            output_file.write('\n')
+
+
+def make_predictions(n_rows, seed=1):
+    # Probabilities of the positive class like the ensemble builder writes
+    # them for binary tasks, with some values that format specially
+    rng = np.random.RandomState(seed)
+    predictions = rng.rand(n_rows).astype(np.float32)
+    predictions[::7] = rng.rand(len(predictions[::7])) * 1e-7
+    predictions[::11] = 0
+    predictions[::13] = 1
+    return predictions
+
+
+def main(sizes):
+    directory = tempfile.mkdtemp()
+    try:
+        backend = Backend(BackendContext(os.path.join(directory, 'tmp'),
+                                         os.path.join(directory, 'output'),
+                                         False, False))
+        old_filepath = os.path.join(directory, 'rowwise.predict')
+        new_filepath = os.path.join(backend.output_directory,
+                                    'bench_test.predict')
+
+        print('%10s %16s %16s %8s' % ('rows', 'row-wise rows/s',
+                                      'chunked rows/s', 'speedup'))
+        for n_rows in sizes:
+            predictions = make_predictions(n_rows)
+
+            start = time.time()
+            save_predictions_as_txt_rowwise(predictions, old_filepath, 8)
+            old_time = time.time() - start
+
+            start = time.time()
+            backend.save_predictions_as_txt(predictions, 'test', 0, 8,
+                                            prefix='bench')
+            new_time = time.time() - start
+
+            with open(old_filepath, 'rb') as old, \
+                    open(new_filepath, 'rb') as new:
+                assert old.read() == new.read()
+            print('%10d %16.0f %16.0f %8.1f' % (n_rows, n_rows / old_time,
+                                                n_rows / new_time,
+                                                old_time / new_time))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1000000, 10000000])
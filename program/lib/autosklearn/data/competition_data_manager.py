@@ -27,6 +27,10 @@ except Exception:
 
 BIG_DATASET_SIZE = 500 * 1024 * 1024
 ONEHOT_MAX_UNIQUE_VALUES = 20
+# Streaming ingestion: rows used to infer the column dtypes and rows parsed
+# per chunk
+STREAMING_SAMPLE_ROWS = 10000
+STREAMING_CHUNKSIZE = 100000
 
 
 def parse_dt(x):
@@ -40,6 +44,126 @@ def parse_dt(x):
         return None
 
 
+# Offsets of the fields in the two fixed-width formats accepted by parse_dt,
+# '%Y-%m-%d' and '%Y-%m-%d %H:%M:%S'.
+_DT_DATE_LENGTH = len('2010-01-01')
+_DT_DATETIME_LENGTH = len('2010-01-01 10:10:10')
+_DT_DIGIT_POSITIONS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_DT_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31],
+                             dtype=np.int64)
+# datetime64[ns] can only represent the years 1677-2262
+_DT_MIN_YEAR = 1678
+_DT_MAX_YEAR = 2261
+
+
+def _days_from_civil(year, month, day):
+    # Vectorized version of H. Hinnant's days_from_civil, returns the number
+    # of days since 1970-01-01 for the proleptic gregorian calendar.
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 \
+        + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_dt_array(values):
+    """Vectorized equivalent of ``parse_dt`` for a whole column.
+
+    Parses both fixed-width formats accepted by ``parse_dt`` directly from
+    the code points of the strings. Values which are not strings, have a
+    different length or do not describe a valid date are treated as missing.
+
+    Returns
+    -------
+    fields : dict
+        Integer arrays ``year``, ``month``, ``day``, ``hour``, ``minute``,
+        ``second`` and ``days`` (days since the epoch), each of the length
+        of ``values``; entries are only meaningful where ``valid`` is True.
+    valid : np.ndarray
+        Boolean mask of the successfully parsed entries.
+    """
+    values = pd.Series(values)
+    n = len(values)
+    try:
+        lengths = values.str.len().values
+    except AttributeError:
+        # Not a single string in the column (e.g. all NaN)
+        lengths = np.full(n, np.nan)
+    is_date = lengths == _DT_DATE_LENGTH
+    is_datetime = lengths == _DT_DATETIME_LENGTH
+    candidates = np.flatnonzero(is_date | is_datetime)
+
+    fields = {name: np.zeros(n, dtype=np.int64)
+              for name in ('year', 'month', 'day', 'hour', 'minute', 'second',
+                           'days')}
+    valid = np.zeros(n, dtype=bool)
+    if len(candidates) == 0:
+        return fields, valid
+
+    # One row of code points per string, shorter strings are zero-padded
+    chars = np.asarray(values.values[candidates],
+                       dtype='U%d' % _DT_DATETIME_LENGTH)
+    chars = chars.view(np.uint32).reshape(len(candidates),
+                                          _DT_DATETIME_LENGTH)
+    chars = chars.astype(np.int64)
+    digits = chars - ord('0')
+    long_format = is_datetime[candidates]
+
+    ok = (chars[:, 4] == ord('-')) & (chars[:, 7] == ord('-'))
+    date_digits = digits[:, _DT_DIGIT_POSITIONS[:8]]
+    ok &= np.all((date_digits >= 0) & (date_digits <= 9), axis=1)
+    time_digits = digits[:, _DT_DIGIT_POSITIONS[8:]]
+    time_ok = (chars[:, 10] == ord(' ')) & (chars[:, 13] == ord(':')) \
+        & (chars[:, 16] == ord(':')) \
+        & np.all((time_digits >= 0) & (time_digits <= 9), axis=1)
+    ok &= ~long_format | time_ok
+    # Zero out the (padding) time part of the date-only strings
+    digits[~long_format, 10:] = 0
+    digits[~ok] = 0
+
+    def number(first, last):
+        rval = np.zeros(len(candidates), dtype=np.int64)
+        for position in range(first, last):
+            rval = rval * 10 + digits[:, position]
+        return rval
+
+    year = number(0, 4)
+    month = number(5, 7)
+    day = number(8, 10)
+    hour = number(11, 13)
+    minute = number(14, 16)
+    second = number(17, 19)
+
+    is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    ok &= (year >= _DT_MIN_YEAR) & (year <= _DT_MAX_YEAR)
+    ok &= (month >= 1) & (month <= 12)
+    days_in_month = _DT_DAYS_IN_MONTH[np.clip(month, 0, 12)] \
+        + ((month == 2) & is_leap)
+    ok &= (day >= 1) & (day <= days_in_month)
+    ok &= (hour <= 23) & (minute <= 59) & (second <= 59)
+
+    parsed = candidates[ok]
+    valid[parsed] = True
+    for name, field in (('year', year), ('month', month), ('day', day),
+                        ('hour', hour), ('minute', minute),
+                        ('second', second)):
+        fields[name][parsed] = field[ok]
+    fields['days'][parsed] = _days_from_civil(year[ok], month[ok], day[ok])
+    return fields, valid
+
+
+def _datetime_feature(values, valid):
+    # Mimic the dtypes pandas infers for the row-wise version: integers if
+    # every value could be parsed, floats with NaN for the missing ones.
+    if np.all(valid):
+        return values
+    rval = values.astype(np.float64)
+    rval[~valid] = np.nan
+    return rval
+
+
 def transform_datetime_features(df):
     datetime_columns = [
         col_name
@@ -47,16 +171,83 @@ def transform_datetime_features(df):
         if col_name.startswith('datetime')
     ]
     for col_name in datetime_columns:
-        df[col_name] = df[col_name].apply(lambda x: parse_dt(x))
-        df['number_weekday_{}'.format(col_name)] = df[col_name].apply(lambda x: x.weekday())
-        df['number_month_{}'.format(col_name)] = df[col_name].apply(lambda x: x.month)
-        df['number_day_{}'.format(col_name)] = df[col_name].apply(lambda x: x.day)
-        df['number_hour_{}'.format(col_name)] = df[col_name].apply(lambda x: x.hour)
-        df['number_hour_of_week_{}'.format(col_name)] = df[col_name].apply(lambda x: x.hour + x.weekday() * 24)
-        df['number_minute_of_day_{}'.format(col_name)] = df[col_name].apply(lambda x: x.minute + x.hour * 60)
+        fields, valid = parse_dt_array(df[col_name])
+
+        seconds = fields['days'] * 86400 + fields['hour'] * 3600 \
+            + fields['minute'] * 60 + fields['second']
+        timestamps = seconds.astype('datetime64[s]').astype('datetime64[ns]')
+        timestamps[~valid] = np.datetime64('NaT')
+        df[col_name] = pd.Series(timestamps, index=df.index)
+
+        # 1970-01-01 was a thursday, monday is zero
+        weekday = (fields['days'] + 3) % 7
+        features = (
+            ('number_weekday_{}', weekday),
+            ('number_month_{}', fields['month']),
+            ('number_day_{}', fields['day']),
+            ('number_hour_{}', fields['hour']),
+            ('number_hour_of_week_{}', fields['hour'] + weekday * 24),
+            ('number_minute_of_day_{}',
+             fields['minute'] + fields['hour'] * 60),
+        )
+        for template, values in features:
+            df[template.format(col_name)] = _datetime_feature(values, valid)
     return df
 
 
+def categorical_mapping(col_unique_values):
+    # Maps every unique value to its index in order of first appearance
+    replace_list = np.column_stack((col_unique_values,
+                                    np.arange(len(col_unique_values))))
+    return {k: int(v) for (k, v) in replace_list}
+
+
+def infer_csv_dtypes(filename, sample_rows=STREAMING_SAMPLE_ROWS):
+    """Infer the dtypes to read a competition csv with from a prefix of it.
+
+    Columns are mapped by their prefix: ``datetime_*`` columns are read as
+    strings, numerical columns (``number_*`` and every other column which is
+    numerical in the sample) as float64 and everything else as object. The
+    target is left to pandas to keep the dtype of the labels."""
+    sample = pd.read_csv(filename, nrows=sample_rows)
+    dtypes = {}
+    for col_name, dtype in sample.dtypes.items():
+        if col_name == 'target':
+            continue
+        elif col_name.startswith('datetime'):
+            dtypes[col_name] = object
+        elif dtype.kind in 'iuf':
+            dtypes[col_name] = np.float64
+        else:
+            dtypes[col_name] = object
+    return dtypes
+
+
+def scan_csv(filename, dtypes, chunksize=STREAMING_CHUNKSIZE):
+    """First pass of the streaming ingestion.
+
+    Returns the number of rows, the columns after adding the datetime
+    features and, for every column, its unique values in order of first
+    appearance. Only up to ``ONEHOT_MAX_UNIQUE_VALUES + 1`` unique values are
+    kept per column; this is enough to decide how a column is treated."""
+    n_rows = 0
+    columns = None
+    uniques = {}
+    for chunk in pd.read_csv(filename, dtype=dtypes, chunksize=chunksize):
+        chunk = transform_datetime_features(chunk)
+        if columns is None:
+            columns = list(chunk.columns)
+        n_rows += len(chunk)
+        for col_name in columns:
+            chunk_unique_values = chunk[col_name].unique()
+            if col_name in uniques:
+                chunk_unique_values = pd.unique(np.concatenate(
+                    (uniques[col_name], chunk_unique_values)))
+            uniques[col_name] = \
+                chunk_unique_values[:ONEHOT_MAX_UNIQUE_VALUES + 1]
+    return n_rows, columns, uniques
+
+
 def data_dense(filename, feat_type=None):
     # The 2nd parameter makes possible a using of the 3 functions of data
     # reading (data, data_sparse, data_binary_sparse) without changing
@@ -190,7 +381,8 @@ def load_labels(filename):
 
 
 class CompetitionDataManager():
-    def __init__(self, name, args, max_memory_in_mb=1048576):
+    def __init__(self, name, args, max_memory_in_mb=1048576, streaming=False,
+                 dtype=np.float32, chunksize=STREAMING_CHUNKSIZE):
         if name.endswith("/"):
             name = name[:-1]
         input_dir = os.path.dirname(name)
@@ -203,7 +395,19 @@ class CompetitionDataManager():
         self.feat_type_dict = {}
 
         self.input_dir = os.path.join(input_dir, name)
-        self.load_data(input_dir, max_memory_in_mb)
+        if streaming:
+            try:
+                self.load_data_streaming(input_dir, dtype, chunksize)
+            except ValueError as e:
+                # The dtypes inferred from the sample do not hold for the
+                # whole file
+                warnings.warn('Streaming ingestion failed (%s), reading the '
+                              'data in memory.' % e)
+                self.data = {}
+                self.model_config = {}
+                self.load_data(input_dir, max_memory_in_mb)
+        else:
+            self.load_data(input_dir, max_memory_in_mb)
         self.load_info()
 
     def load_data(self, input_dir, max_memory_in_mb):
@@ -250,14 +454,103 @@ class CompetitionDataManager():
 
         self.feat_type = list([d[col] for col in Xtr])
 
+    def load_data_streaming(self, input_dir, dtype, chunksize):
+        """Memory-efficient version of ``load_data``.
+
+        Reads both csv files twice in chunks: the first pass collects the
+        number of rows and the unique values per column, the second one
+        applies the categorical mappings and writes the used columns straight
+        into preallocated matrices of type ``dtype``. The result equals the
+        one of ``load_data`` converted to ``dtype``."""
+        train_path = os.path.join(input_dir, self.name, 'train.csv')
+        test_path = os.path.join(input_dir, self.name, 'test.csv')
+        print(train_path)
+
+        train_dtypes = infer_csv_dtypes(train_path)
+        test_dtypes = infer_csv_dtypes(test_path)
+        n_train, train_columns, train_uniques = scan_csv(
+            train_path, train_dtypes, chunksize)
+        n_test, test_columns, test_uniques = scan_csv(
+            test_path, test_dtypes, chunksize)
+        train_columns = [col for col in train_columns if col != 'target']
+
+        # Same column selection as in load_data and string_preprocessing
+        used_columns = []
+        train_mappings = {}
+        test_mappings = {}
+        for columns, uniques, mappings in (
+                (train_columns, train_uniques, train_mappings),
+                (test_columns, test_uniques, test_mappings)):
+            for col in columns:
+                if 2 < len(uniques[col]) <= ONEHOT_MAX_UNIQUE_VALUES:
+                    mappings[col] = categorical_mapping(uniques[col])
+                    used_columns.append(col)
+        self.model_config['categorical_values'] = {
+            col: test_uniques[col] for col in test_mappings
+        }
+
+        d = {}
+        for col in train_columns:
+            if len(train_uniques[col]) <= 2:
+                d[col] = 'Binary'
+            elif col.startswith('string'):
+                d[col] = 'Categorical'
+            elif col.startswith('number'):
+                d[col] = 'Numerical'
+                used_columns.append(col)
+        self.model_config['used_columns'] = used_columns
+
+        self.data['X_train'], Ytr = self._read_used_columns(
+            train_path, train_dtypes, train_mappings, used_columns, n_train,
+            dtype, chunksize, target=True)
+        self.data['Y_train'] = Ytr
+        self.data['X_test'], _ = self._read_used_columns(
+            test_path, test_dtypes, test_mappings, used_columns, n_test,
+            dtype, chunksize, target=False)
+
+        self.feat_type = list([d[col] for col in used_columns])
+
+    def _read_used_columns(self, filename, dtypes, mappings, used_columns,
+                           n_rows, dtype, chunksize, target):
+        # Second pass of the streaming ingestion
+        header = list(pd.read_csv(filename, nrows=0).columns)
+        usecols = [
+            col for col in header
+            if col in used_columns or col.startswith('datetime') or
+            (target and col == 'target')
+        ]
+        # Columns which are not remapped can be parsed into the final dtype
+        # right away, remapped ones need the same dtype as in the first pass
+        dtypes = {
+            col: (dtype if dtypes[col] is np.float64 and col not in mappings
+                  else dtypes[col])
+            for col in usecols if col in dtypes
+        }
+
+        X = np.empty((n_rows, len(used_columns)), dtype=dtype)
+        y = []
+        start = 0
+        for chunk in pd.read_csv(filename, usecols=usecols, dtype=dtypes,
+                                 chunksize=chunksize):
+            chunk = transform_datetime_features(chunk)
+            for col, replace_dict in mappings.items():
+                chunk[col] = chunk[col].map(replace_dict)
+            X[start: start + len(chunk)] = chunk[used_columns].values
+            if target:
+                y.append(chunk['target'].values)
+            start += len(chunk)
+        assert start == n_rows, (start, n_rows)
+
+        y = np.concatenate(y) if target else None
+        return X, y
+
     def string_preprocessing(self, df):
         categorical_values = {}
         for col in df:
             col_unique_values = df[col].unique()
             if 2 < len(col_unique_values) <= ONEHOT_MAX_UNIQUE_VALUES:
                 categorical_values[col] = col_unique_values
-                replace_list = np.column_stack((col_unique_values, np.arange(len(col_unique_values))))
-                replace_dict = {k: int(v) for (k, v) in replace_list}
+                replace_dict = categorical_mapping(col_unique_values)
                 df[col] = df[col].map(replace_dict)
                 self.model_config['used_columns'].append(col)
 
@@ -1,9 +1,7 @@
 # -*- encoding: utf-8 -*-
 
 import multiprocessing
-import glob
 import os
-import re
 import time
 import traceback
 
@@ -70,7 +68,8 @@ class EnsembleBuilder(multiprocessing.Process):
             precision: ["16","32","64","128"]
                 precision of floats to read the predictions 
             sleep_duration: int
-                duration of sleeping time between two iterations of this script (in sec)
+                maximal duration of waiting for new predictions between two
+                iterations of this script (in sec)
             memory_limit: int
                 memory limit in mb
             read_at_most: int 
@@ -119,14 +118,17 @@ class EnsembleBuilder(multiprocessing.Process):
         self.logger = get_logger(logger_name)
 
         self.start_time = 0
-        self.model_fn_re = re.compile(r'_([0-9]*)_([0-9]*)\.npy')
-        
+
+        # Evaluations announce their predictions in the predictions manifest
+        # of the backend, only runs announced after this offset are new
+        self.manifest_offset = 0
+        # announced prediction files not read yet because of read_at_most
+        self.unread_preds = []
+
         # already read prediction files
         # {"file name": {
         #    "ens_score": float
-        #    "mtime_ens": str,
-        #    "mtime_valid": str,
-        #    "mtime_test": str,
+        #    "test_fn": str,
         #    "seed": int,
         #    "num_run": int,
         #    Y_ENSEMBLE: np.ndarray
@@ -134,6 +136,8 @@ class EnsembleBuilder(multiprocessing.Process):
         #    Y_TEST: np.ndarray
         # }
         self.read_preds = {}
+        # test set, loaded when the first deferred test predictions are made
+        self.X_test = None
         self.last_hash = None  # hash of ensemble training data
         self.y_true_ensemble = None
         self.SAVE2DISC = True
@@ -190,7 +194,7 @@ class EnsembleBuilder(multiprocessing.Process):
             
             # populates self.read_preds
             if not self.read_ensemble_preds():
-                time.sleep(self.sleep_duration)
+                self.wait_for_predictions()
                 continue
                 
             selected_models = self.get_n_best_preds()
@@ -224,13 +228,26 @@ class EnsembleBuilder(multiprocessing.Process):
                 #  next iteration!
                 self.predict(set_="test", 
                              ensemble=ensemble, 
-                             selected_keys=n_sel_test, 
+                             selected_keys=selected_models, 
                              n_preds=len(selected_models), 
                              index_run=iteration)
                 iteration += 1
             else:
-                time.sleep(self.sleep_duration)
-            
+                self.wait_for_predictions()
+
+    def wait_for_predictions(self):
+        """
+            block until new predictions are announced, at most
+            self.sleep_duration seconds
+        """
+        deadline = time.time() + self.sleep_duration
+        while not self.unread_preds and \
+                self.backend.get_predictions_manifest_size() <= \
+                self.manifest_offset:
+            if time.time() >= deadline:
+                break
+            time.sleep(0.1)
+
     def read_ensemble_preds(self):
         """
             reading predictions on ensemble building data set; 
@@ -248,51 +265,22 @@ class EnsembleBuilder(multiprocessing.Process):
                 )
                 return False
             
-        # no validation predictions so far -- no dir
-        if not os.path.isdir(self.dir_ensemble):
-            self.logger.debug("No ensemble dataset prediction directory found")
-            return False
-        
-        if self.seed > -1:
-            pred_path = os.path.join(
-                    self.dir_ensemble,
-                    'predictions_ensemble_%s_*.npy' % self.seed)
-        else:
-            pred_path = os.path.join(
-                    self.dir_ensemble,
-                    'predictions_ensemble_*_*.npy')
-
-        y_ens_files = glob.glob(pred_path)
-        # no validation predictions so far -- no files
-        if len(y_ens_files) == 0:
-            self.logger.debug("Found no prediction files on ensemble data set:"
-                              " %s" % pred_path)
-            return False
-        
-        n_read_files = 0
-        for y_ens_fn in y_ens_files:
-            
-            if self.read_at_most and n_read_files >= self.read_at_most:
-                # limit the number of files that will be read 
-                # to limit memory consumption
-                break
-            
-            if not y_ens_fn.endswith(".npy"):
-                self.logger.info('Error loading file (not .npy): %s', y_ens_fn)
+        entries, self.manifest_offset = self.backend.read_predictions_manifest(
+            self.manifest_offset)
+        for _seed, _num_run in entries:
+            if self.seed > -1 and int(_seed) != self.seed:
                 continue
-            
-            match = self.model_fn_re.search(y_ens_fn)
-            _seed = int(match.group(1))
-            _num_run = int(match.group(2))
-            
+            y_ens_fn = os.path.join(
+                self.dir_ensemble,
+                'predictions_ensemble_%s_%s.npy' % (_seed, _num_run))
             if not self.read_preds.get(y_ens_fn):
                 self.read_preds[y_ens_fn] = {
                     "ens_score": -1,
-                    "mtime_ens": 0,
-                    "mtime_valid": 0,
-                    "mtime_test": 0,
-                    "seed": _seed,
-                    "num_run": _num_run,
+                    "test_fn": os.path.join(
+                        self.dir_test,
+                        'predictions_test_%s_%s.npy' % (_seed, _num_run)),
+                    "seed": int(_seed),
+                    "num_run": int(_num_run),
                     Y_ENSEMBLE: None,
                     Y_VALID: None,
                     Y_TEST: None,
@@ -302,41 +290,51 @@ class EnsembleBuilder(multiprocessing.Process):
                     # 2 - loaded but dropped again
                     "loaded": 0
                 }
-                
-            if self.read_preds[y_ens_fn]["mtime_ens"] == os.path.getmtime(y_ens_fn):
-                # same time stamp; nothing changed;
-                continue
+            # a run announced again has overwritten its predictions
+            if y_ens_fn not in self.unread_preds:
+                self.unread_preds.append(y_ens_fn)
+
+        # no validation predictions so far
+        if len(self.read_preds) == 0:
+            self.logger.debug("Found no prediction files on ensemble data set")
+            return False
+
+        n_read_files = 0
+        while self.unread_preds:
+
+            if self.read_at_most and n_read_files >= self.read_at_most:
+                # limit the number of files that will be read 
+                # to limit memory consumption
+                break
+
+            y_ens_fn = self.unread_preds.pop(0)
 
             # actually read the predictions
             # and score them
             try:
-                with open(y_ens_fn, 'rb') as fp:
-                    y_ensemble = self._read_np_fn(fp=fp)
-                    score = calculate_score(solution=self.y_true_ensemble,  # y_ensemble = y_true for ensemble set
-                                            prediction=y_ensemble,
-                                            task_type=self.task_type,
-                                            metric=self.metric,
-                                            all_scoring_functions=False)
-
-                    if self.read_preds[y_ens_fn]["ens_score"] > -1:
-                        self.logger.critical(
-                            'Changing ensemble score for file %s from %f to %f '
-                            'because file modification time changed? %f - %f',
-                            y_ens_fn,
-                            self.read_preds[y_ens_fn]["ens_score"],
-                            score,
-                            self.read_preds[y_ens_fn]["mtime_ens"],
-                            os.path.getmtime(y_ens_fn),
-                        )
-
-                    self.read_preds[y_ens_fn]["ens_score"] = score
-                    self.read_preds[y_ens_fn][Y_ENSEMBLE] = y_ensemble
-                    self.read_preds[y_ens_fn]["mtime_ens"] = os.path.getmtime(
-                        y_ens_fn
+                y_ensemble = self._read_np_fn(fp=y_ens_fn)
+                score = calculate_score(solution=self.y_true_ensemble,  # y_ensemble = y_true for ensemble set
+                                        prediction=y_ensemble,
+                                        task_type=self.task_type,
+                                        metric=self.metric,
+                                        all_scoring_functions=False)
+
+                if self.read_preds[y_ens_fn]["ens_score"] > -1:
+                    self.logger.critical(
+                        'Changing ensemble score for file %s from %f to %f '
+                        'because the run was announced again?',
+                        y_ens_fn,
+                        self.read_preds[y_ens_fn]["ens_score"],
+                        score,
                     )
-                    self.read_preds[y_ens_fn]["loaded"] = 1
 
-                    n_read_files += 1
+                self.read_preds[y_ens_fn]["ens_score"] = score
+                self.read_preds[y_ens_fn][Y_ENSEMBLE] = y_ensemble
+                # the test predictions are outdated
+                self.read_preds[y_ens_fn][Y_TEST] = None
+                self.read_preds[y_ens_fn]["loaded"] = 1
+
+                n_read_files += 1
 
             except:
                 self.logger.warning(
@@ -380,7 +378,8 @@ class EnsembleBuilder(multiprocessing.Process):
             self.logger.warning("No models better than random - using Dummy Classifier!")
             sorted_keys = [
                 (k, v["ens_score"], v["num_run"]) for k, v in self.read_preds.items()
-                if v["seed"] == self.seed and v["num_run"] == 1
+                if (self.seed < 0 or v["seed"] == self.seed)
+                and v["num_run"] == 1
             ]
         # reload predictions if scores changed over time and a model is
         # considered to be in the top models again!
@@ -424,6 +423,16 @@ class EnsembleBuilder(multiprocessing.Process):
                     self.read_preds[k]['ens_score'],
                 )
                 self.read_preds[k]['loaded'] = 2
+                # the model can't get back into the ensemble, unless its run
+                # is announced again with a new predictor
+                self.backend.delete_test_predictor(
+                    self.read_preds[k]['seed'],
+                    self._get_idx(k),
+                )
+                self.backend.delete_model(
+                    self.read_preds[k]['seed'],
+                    self.read_preds[k]['num_run'],
+                )
 
         # return best scored keys of self.read_preds
         return sorted_keys[:ensemble_n_best]
@@ -451,12 +460,7 @@ class EnsembleBuilder(multiprocessing.Process):
             #     os.path.join(self.dir_valid, 'predictions_valid_%d_*0%d.npy'
             #                         % (self.read_preds[k]["seed"],
             #                            self.read_preds[k]["num_run"])))
-            test_fn = glob.glob(
-                os.path.join(self.dir_test, 'predictions_test_%d_*0%d.npy' %
-                                   (self.read_preds[k]["seed"],
-                                    self.read_preds[k]["num_run"])))
-            
-            # TODO don't read valid and test if not changed
+            test_fn = self.read_preds[k]["test_fn"]
             
             # if len(valid_fn) == 0:
             #     self.logger.debug("Not found validation prediction file "
@@ -478,26 +482,26 @@ class EnsembleBuilder(multiprocessing.Process):
             #         self.logger.warning('Error loading %s: %s',
             #                             valid_fn, traceback.format_exc())
         
-            if len(test_fn) == 0:
+            # the test predictions are re-read only if the run was
+            # announced again
+            if self.read_preds[k][Y_TEST] is not None:
+                success_keys_test.append(k)
+                continue
+            # deferred test predictions are made only for ensemble members
+            if self._get_test_predictor_mtime(k) is not None:
+                success_keys_test.append(k)
+                continue
+            try:
+                y_test = self._read_np_fn(test_fn)
+                self.read_preds[k][Y_TEST] = y_test
+                success_keys_test.append(k)
+            except FileNotFoundError:
                 self.logger.debug("Not found test prediction file (although "
                                   "ensemble predictions available):%s" %
                                   test_fn)
-            else:
-                test_fn = test_fn[0]
-                if self.read_preds[k]["mtime_test"] == \
-                        os.path.getmtime(test_fn) \
-                        and self.read_preds[k][Y_TEST] is not None:
-                    success_keys_test.append(k)
-                    continue
-                try:
-                    with open(test_fn, 'rb') as fp:
-                        y_test = self._read_np_fn(fp)
-                        self.read_preds[k][Y_TEST] = y_test
-                        success_keys_test.append(k)
-                        self.read_preds[k]["mtime_test"] = os.path.getmtime(test_fn)
-                except Exception as e:
-                    self.logger.warning('Error loading %s: %s',
-                                        test_fn, traceback.format_exc())
+            except Exception as e:
+                self.logger.warning('Error loading %s: %s',
+                                    test_fn, traceback.format_exc())
                 
         return success_keys_valid, success_keys_test
         
@@ -596,9 +600,25 @@ class EnsembleBuilder(multiprocessing.Process):
         if self.SAVE2DISC:
             self.backend.save_ensemble(ensemble, index_run, self.seed)
 
-        predictions = np.array([
+        predictions = [
             self.read_preds[k][Y_VALID if set_ == 'valid' else Y_TEST]
             for k in selected_keys
+        ]
+        if set_ == 'test':
+            # deferred test predictions are only made for members with
+            # weight, the others do not contribute to the prediction
+            for i, k in enumerate(selected_keys):
+                if predictions[i] is None and ensemble.weights_[i] > 0:
+                    predictions[i] = self._predict_test_set(k)
+                    self.read_preds[k][Y_TEST] = predictions[i]
+            available = [pred for pred in predictions if pred is not None]
+            missing = [i for i, pred in enumerate(predictions) if pred is None]
+            if available and \
+                    all(ensemble.weights_[i] == 0 for i in missing):
+                for i in missing:
+                    predictions[i] = np.zeros_like(available[0])
+        predictions = np.array([
+            pred for pred in predictions if pred is not None
         ])
         
         if n_preds == predictions.shape[0]:
@@ -625,13 +645,91 @@ class EnsembleBuilder(multiprocessing.Process):
             return None
         # TODO: ADD saving of predictions on "ensemble data"
     
-    def _read_np_fn(self, fp):
+    def _get_idx(self, k):
+        # num_run as used in the names of the prediction files
+        return str(self.read_preds[k]["num_run"]).zfill(5)
+
+    def _get_test_predictor_mtime(self, k):
+        """
+            modification time of the test predictor of a run whose test
+            predictions were deferred by the evaluator; None if there is no
+            predictor or its predictions are already cached on disc
+        """
+        mtime = self.backend.get_test_predictor_mtime(
+            self.read_preds[k]["seed"], self._get_idx(k))
+        if mtime is None:
+            return None
+        try:
+            # cached predictions carry the modification time of their
+            # predictor
+            if os.stat(self.read_preds[k]["test_fn"]).st_mtime_ns == mtime:
+                return None
+        except OSError:
+            pass
+        return mtime
+
+    def _predict_test_set(self, k):
+        """
+            get test predictions of a run, predict the test set with its
+            stored model if they were deferred by the evaluator
+
+            Parameters
+            ---------
+            k: str
+                key of self.read_preds
+
+            Return
+            ------
+            y_test: np.ndarray or None if the predictions are not available
+        """
+        seed = self.read_preds[k]["seed"]
+        idx = self._get_idx(k)
+        test_fn = self.read_preds[k]["test_fn"]
+
+        mtime = self._get_test_predictor_mtime(k)
+        try:
+            if mtime is None:
+                return self._read_np_fn(test_fn)
+
+            if self.X_test is None:
+                self.X_test = self.backend.load_datamanager().data['X_test']
+            predictor = self.backend.load_test_predictor(seed, idx)
+            model = self.backend.load_model_by_seed_and_id(
+                seed, self.read_preds[k]["num_run"])
+            start_time = time.time()
+            y_test = predictor.predict(model, self.X_test, batch_size=1000)
+            self.logger.debug(
+                "Predicting the test set with model (%d,%d) took %.2f seconds.",
+                seed,
+                self.read_preds[k]["num_run"],
+                time.time() - start_time,
+            )
+            self.backend.save_predictions_as_npy(y_test, 'test', seed, idx)
+            # a newer predictor may have replaced the loaded one meanwhile,
+            # then the predictions are made again next time
+            os.utime(test_fn, ns=(mtime, mtime))
+            return self._convert_precision(y_test)
+        except FileNotFoundError:
+            self.logger.debug("Not found test predictions or model (although "
+                              "ensemble predictions available): %s", test_fn)
+        except Exception:
+            self.logger.warning('Error predicting the test set with model '
+                                '%s: %s', k, traceback.format_exc())
+        return None
+
+    def _convert_precision(self, predictions):
+        # predictions already in the requested precision are not copied
         if self.precision is "16":
-            predictions = np.load(fp).astype(dtype=np.float16)
+            predictions = predictions.astype(dtype=np.float16, copy=False)
         elif self.precision is "32":
-            predictions = np.load(fp).astype(dtype=np.float32)
+            predictions = predictions.astype(dtype=np.float32, copy=False)
         elif self.precision is "64":
-            predictions = np.load(fp).astype(dtype=np.float64)
-        else:
-            predictions = np.load(fp)
+            predictions = predictions.astype(dtype=np.float64, copy=False)
         return predictions
+
+    def _read_np_fn(self, fp):
+        # The predictions are stored as float32 .npy files and memory-mapped,
+        # only the pages the ensemble actually touches are read. A run that
+        # is announced again replaces its files, the mapping keeps the old
+        # predictions until they are read again.
+        return self._convert_precision(np.load(fp, mmap_mode='r'))
@@ -7,6 +7,61 @@ from autosklearn.constants import *
 from autosklearn.ensembles.abstract_ensemble import AbstractEnsemble
 from autosklearn.metrics import calculate_score
 from autosklearn.metrics import Scorer
+from autosklearn.metrics import roc_auc
+
+
+# Upper bound on the number of scores ranked at once by the batched ROC AUC.
+# Ranking takes about 50 bytes per score (the argsort, the sorted scores, the
+# group bounds, the ranks and their temporaries), the candidate predictions
+# of a batch another 16, so a batch needs roughly 70MB of the ensemble
+# builder's memory limit
+BATCH_SIZE = 1000000
+
+
+def batched_roc_auc(y_true, y_score):
+    """ROC AUC of every row of ``y_score`` w.r.t. the binary ``y_true``.
+
+    Uses the Mann-Whitney U statistic, tied scores get their average rank.
+    This equals ``sklearn.metrics.roc_auc_score`` for each row, but all rows
+    are ranked with one call to ``np.argsort``.
+
+    Parameters
+    ----------
+    y_true : array-like, [n_samples]
+        Boolean array, ``True`` for the positive class.
+
+    y_score : array-like, [n_rows x n_samples]
+        Scores of the positive class.
+
+    Returns
+    -------
+    scores : array-like, [n_rows]
+    """
+    y_true = np.asarray(y_true, dtype=bool)
+    n_rows, n_samples = y_score.shape
+    n_pos = np.sum(y_true)
+    n_neg = n_samples - n_pos
+
+    order = np.argsort(y_score, axis=1, kind='mergesort')
+    sorted_score = y_score[np.arange(n_rows)[:, np.newaxis], order]
+    sorted_true = y_true[order]
+
+    # Tied scores form a group, every member is given the average of the
+    # first and the last rank in the group
+    positions = np.arange(n_samples)
+    starts = np.zeros(y_score.shape, dtype=np.int64)
+    ends = np.empty(y_score.shape, dtype=np.int64)
+    ends[:] = n_samples - 1
+    new_group = sorted_score[:, 1:] != sorted_score[:, :-1]
+    starts[:, 1:] = np.where(new_group, positions[1:], 0)
+    ends[:, :-1] = np.where(new_group, positions[:-1], n_samples - 1)
+    starts = np.maximum.accumulate(starts, axis=1)
+    ends = np.minimum.accumulate(ends[:, ::-1], axis=1)[:, ::-1]
+    # Ranks are multiples of 0.5, summing them is exact
+    ranks = (starts + ends + 2) / 2.
+
+    rank_sum = np.sum(ranks * sorted_true, axis=1)
+    return (rank_sum - n_pos * (n_pos + 1) / 2.) / (n_pos * n_neg)
 
 
 class EnsembleSelection(AbstractEnsemble):
@@ -39,7 +94,9 @@ class EnsembleSelection(AbstractEnsemble):
         return self
 
     def _fit(self, predictions, labels):
-        if self.mode == 'fast':
+        if self.mode == 'fast' and self._is_binary_roc_auc(labels):
+            self._fast_binary_roc_auc(predictions, labels)
+        elif self.mode == 'fast':
             self._fast(predictions, labels)
         else:
             self._slow(predictions, labels)
@@ -104,6 +161,96 @@ class EnsembleSelection(AbstractEnsemble):
         self.trajectory_ = trajectory
         self.train_score_ = trajectory[-1]
 
+    def _is_binary_roc_auc(self, labels):
+        # The batched path handles exactly the case in which calculate_score
+        # ends up in sklearn's roc_auc_score on the positive class column
+        return self.task_type == BINARY_CLASSIFICATION and \
+            self.metric is roc_auc and \
+            np.asarray(labels).ndim == 1 and \
+            len(np.unique(labels)) == 2
+
+    def _fast_binary_roc_auc(self, predictions, labels):
+        """Fast version of Rich Caruana's ensemble selection method for the
+        ROC AUC of binary classification.
+
+        Same as ``_fast``, but the scores of all candidate ensembles are
+        computed at once by ``batched_roc_auc`` and the sum of the
+        ensemble members' predictions is updated incrementally. The
+        candidate predictions are computed with the very same floating point
+        operations as in ``_fast`` and the best candidates are re-scored
+        with ``calculate_score``, so the weights are identical."""
+        self.num_input_models_ = len(predictions)
+
+        trajectory = []
+        order = []
+
+        ensemble_size = self.ensemble_size
+        y_true = labels == np.max(labels)
+        ensemble_sum = np.zeros(predictions[0].shape, dtype=predictions.dtype)
+
+        if self.sorted_initialization:
+            n_best = 20
+            indices = self._sorted_initialization(predictions, labels, n_best)
+            for idx in indices:
+                ensemble_sum += predictions[idx]
+                order.append(idx)
+                ensemble_ = ensemble_sum / len(order)
+                ensemble_performance = calculate_score(
+                    labels, ensemble_, self.task_type, self.metric,
+                    ensemble_.shape[1])
+                trajectory.append(ensemble_performance)
+            ensemble_size -= n_best
+
+        batch_size = max(1, BATCH_SIZE // predictions.shape[1])
+        for i in range(ensemble_size):
+            s = len(order)
+            if s == 0:
+                weighted_ensemble_prediction = np.zeros(ensemble_sum.shape)
+            else:
+                weighted_ensemble_prediction = (s / float(s + 1)) * \
+                                               (ensemble_sum / s)
+            scores = np.zeros((len(predictions)))
+            for start in range(0, len(predictions), batch_size):
+                # Only the positive class column is scored
+                fant_ensemble_predictions = \
+                    weighted_ensemble_prediction[:, 1] + \
+                    (1. / float(s + 1)) * \
+                    predictions[start:start + batch_size, :, 1]
+                scores[start:start + batch_size] = batched_roc_auc(
+                    y_true, fant_ensemble_predictions)
+
+            # The exact scores of the best candidates are tied, sklearn's
+            # trapezoidal rule however differs in the last bits for some of
+            # them. The other candidates are worse by at least
+            # 1 / (n_pos * n_neg), so re-scoring only the tied candidates
+            # breaks ties exactly like _fast.
+            candidates = np.argwhere(scores == np.nanmax(scores)).flatten()
+            fant_ensemble_prediction = np.zeros(predictions[0].shape)
+            for j in candidates:
+                fant_ensemble_prediction[:, :] = weighted_ensemble_prediction + \
+                                                 (1. / float(s + 1)) * \
+                                                 predictions[j]
+                scores[j] = calculate_score(
+                    solution=labels,
+                    prediction=fant_ensemble_prediction,
+                    task_type=self.task_type,
+                    metric=self.metric,
+                    all_scoring_functions=False)
+            all_best = candidates[scores[candidates] ==
+                                  np.nanmax(scores[candidates])]
+            best = np.random.choice(all_best)
+            ensemble_sum += predictions[best]
+            trajectory.append(scores[best])
+            order.append(best)
+
+            # Handle special case
+            if len(predictions) == 1:
+                break
+
+        self.indices_ = order
+        self.trajectory_ = trajectory
+        self.train_score_ = trajectory[-1]
+
     def _slow(self, predictions, labels):
         """Rich Caruana's ensemble selection method."""
         self.num_input_models_ = len(predictions)
@@ -51,6 +51,7 @@ class ExecuteTaFuncWithQueue(AbstractTAFunc):
                  run_obj='quality', par_factor=1, all_scoring_functions=False,
                  output_y_hat_optimization=True, include=None, exclude=None,
                  memory_limit=None, disable_file_output=False, init_params=None,
+                 worker_pool=None, defer_test_predictions=False,
                  **resampling_strategy_args):
 
         if resampling_strategy == 'holdout':
@@ -95,7 +96,11 @@ class ExecuteTaFuncWithQueue(AbstractTAFunc):
         self.exclude = exclude
         self.disable_file_output = disable_file_output
         self.init_params = init_params
+        # Let the ensemble builder predict the test set of the runs it selects
+        self.defer_test_predictions = defer_test_predictions
         self.logger = logger
+        # Optional EvaluationWorkerPool which replaces the pynisher
+        self.worker_pool = worker_pool
 
         if memory_limit is not None:
             memory_limit = int(math.ceil(memory_limit))
@@ -165,19 +170,39 @@ class ExecuteTaFuncWithQueue(AbstractTAFunc):
             seed=12345,
             instance_specific=None):
 
-        queue = multiprocessing.Queue()
-
         if not (instance_specific is None or instance_specific == '0'):
             raise ValueError(instance_specific)
-        init_params = {'instance': instance}
-        if self.init_params is not None:
-            init_params.update(self.init_params)
 
+        if self.worker_pool is not None:
+            # The pool worker stays reserved until its queue is read
+            with self.worker_pool.acquire() as worker:
+                return self._run(
+                    config=config,
+                    instance=instance,
+                    queue=worker.queue,
+                    limits=worker.enforce_limits(wall_time_in_s=cutoff),
+                )
+
+        queue = multiprocessing.Queue()
         arguments = dict(
             logger=logging.getLogger("pynisher"),
             wall_time_in_s=cutoff,
             mem_in_mb=self.memory_limit,
         )
+        rval = self._run(
+            config=config,
+            instance=instance,
+            queue=queue,
+            limits=pynisher.enforce_limits(**arguments),
+        )
+        autosklearn.evaluation.util.empty_queue(queue)
+        return rval
+
+    def _run(self, config, instance, queue, limits):
+        init_params = {'instance': instance}
+        if self.init_params is not None:
+            init_params.update(self.init_params)
+
         obj_kwargs = dict(
             queue=queue,
             config=config,
@@ -197,8 +222,9 @@ class ExecuteTaFuncWithQueue(AbstractTAFunc):
         if self.resampling_strategy != 'test':
             obj_kwargs['resampling_strategy'] = self.resampling_strategy
             obj_kwargs['resampling_strategy_args'] = self.resampling_strategy_args
+            obj_kwargs['defer_test_predictions'] = self.defer_test_predictions
 
-        obj = pynisher.enforce_limits(**arguments)(self.ta)
+        obj = limits(self.ta)
         obj(**obj_kwargs)
 
         if obj.exit_status in (pynisher.TimeoutException,
@@ -307,8 +333,6 @@ class ExecuteTaFuncWithQueue(AbstractTAFunc):
         runtime = float(obj.wall_clock_time)
         self.num_run += 1
 
-        autosklearn.evaluation.util.empty_queue(queue)
-
         return status, cost, runtime, additional_run_info
 
 
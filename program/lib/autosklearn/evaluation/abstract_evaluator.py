@@ -13,6 +13,7 @@ from autosklearn.constants import (
     MULTILABEL_CLASSIFICATION,
     MULTICLASS_CLASSIFICATION,
 )
+from autosklearn.pipeline.transform_cache import TransformCache
 from autosklearn.pipeline.implementations.util import (
     convert_multioutput_multiclass_to_multilabel
 )
@@ -23,7 +24,8 @@ from ConfigSpace import Configuration
 
 
 __all__ = [
-    'AbstractEvaluator'
+    'AbstractEvaluator',
+    'DeferredTestPrediction',
 ]
 
 
@@ -92,6 +94,68 @@ class MyDummyRegressor(DummyRegressor):
         return None
 
 
+def _expand_prediction_array(prediction, classes, num_classes):
+    # Models only predict the classes they saw during training, the columns
+    # of the other classes are zero
+    classes = list(classes)
+    mapping = dict()
+    for class_number in range(num_classes):
+        if class_number in classes:
+            index = classes.index(class_number)
+            mapping[index] = class_number
+    new_predictions = np.zeros((prediction.shape[0], num_classes),
+                               dtype=np.float32)
+
+    for index in mapping:
+        class_index = mapping[index]
+        new_predictions[:, class_index] = prediction[:, index]
+
+    return new_predictions
+
+
+class DeferredTestPrediction(object):
+    """Everything but the fitted model needed to predict the test set of a
+    run whose test set predictions are only computed if the ensemble
+    builder selects the run. The model is the one saved for the run.
+
+    Parameters
+    ----------
+    task_type : int
+
+    num_classes : int
+        Number of classes of the dataset.
+
+    Y_train : array, optional
+        Targets the model was fitted on. For multiclass classification, the
+        predictions are expanded to all classes of the dataset.
+    """
+    def __init__(self, task_type, num_classes, Y_train=None):
+        self.task_type = task_type
+        self.num_classes = num_classes
+        if task_type == MULTICLASS_CLASSIFICATION and Y_train is not None:
+            self.classes = np.unique(Y_train)
+        else:
+            self.classes = None
+
+    def predict(self, model, X, batch_size=1000):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            if self.task_type in REGRESSION_TASKS:
+                Y_pred = model.predict(X)
+            else:
+                Y_pred = model.predict_proba(X, batch_size=batch_size)
+
+        if len(Y_pred.shape) == 1:
+            Y_pred = Y_pred.reshape((-1, 1))
+        if self.task_type == MULTICLASS_CLASSIFICATION and \
+                Y_pred.shape[1] < self.num_classes:
+            if self.classes is None:
+                raise ValueError('Y_train must not be None!')
+            Y_pred = _expand_prediction_array(Y_pred, self.classes,
+                                              self.num_classes)
+        return Y_pred
+
+
 class AbstractEvaluator(object):
     def __init__(self, backend, queue, metric,
                  configuration=None,
@@ -103,7 +167,8 @@ class AbstractEvaluator(object):
                  include=None,
                  exclude=None,
                  disable_file_output=False,
-                 init_params=None):
+                 init_params=None,
+                 defer_test_predictions=False):
 
         self.starttime = time.time()
 
@@ -127,6 +192,21 @@ class AbstractEvaluator(object):
         self.output_y_hat_optimization = output_y_hat_optimization
         self.all_scoring_functions = all_scoring_functions
         self.disable_file_output = disable_file_output
+        # If set, the test set is not predicted by the evaluator. The fitted
+        # model is saved and self.test_predictor holds what else is needed for
+        # the ensemble builder to predict the test set if it selects the run.
+        # The test loss is needed for every run if the test labels are known.
+        self.defer_test_predictions = \
+            defer_test_predictions and self.y_test is None and \
+            disable_file_output != True and (
+                not isinstance(disable_file_output, list)
+                or 'model' not in disable_file_output
+            )
+        self.test_predictor = None
+        # Configurations with the same data preprocessing re-use its fitted
+        # steps and the data transformed by them
+        self.transform_cache = TransformCache(
+            self.backend.get_transform_cache_dir())
 
         if self.task_type in REGRESSION_TASKS:
             if not isinstance(self.configuration, Configuration):
@@ -192,7 +272,8 @@ class AbstractEvaluator(object):
                                      random_state=self.seed,
                                      include=self.include,
                                      exclude=self.exclude,
-                                     init_params=self._init_params)
+                                     init_params=self._init_params,
+                                     transform_cache=self.transform_cache)
         return model
 
     def _loss(self, y_true, y_hat):
@@ -323,6 +404,12 @@ class AbstractEvaluator(object):
                 or 'model' not in self.disable_file_output
             )
         ):
+            if self.test_predictor is not None:
+                # Deferred test predictions are made with the saved model
+                try:
+                    os.makedirs(self.backend.get_model_dir())
+                except OSError:
+                    pass
             if os.path.exists(self.backend.get_model_dir()):
                 self.backend.save_model(self.model, self.num_run, seed)
 
@@ -369,6 +456,19 @@ class AbstractEvaluator(object):
         else:
             test_loss = None
 
+        if (
+            self.disable_file_output != True and (
+                not isinstance(self.disable_file_output, list)
+                or 'y_optimization' not in self.disable_file_output
+            )
+        ):
+            if self.test_predictor is not None:
+                self.backend.save_test_predictor(self.test_predictor, seed,
+                                                 num_run)
+            # Tell the ensemble builder that all predictions of this run are
+            # on disk
+            self.backend.announce_predictions(seed, num_run)
+
         return None, {}, validation_loss, test_loss
 
     def _predict_proba(self, X, model, task_type, Y_train):
@@ -408,21 +508,8 @@ class AbstractEvaluator(object):
                 prediction.shape[1] < num_classes:
             if Y_train is None:
                 raise ValueError('Y_train must not be None!')
-            classes = list(np.unique(Y_train))
-
-            mapping = dict()
-            for class_number in range(num_classes):
-                if class_number in classes:
-                    index = classes.index(class_number)
-                    mapping[index] = class_number
-            new_predictions = np.zeros((prediction.shape[0], num_classes),
-                                       dtype=np.float32)
-
-            for index in mapping:
-                class_index = mapping[index]
-                new_predictions[:, class_index] = prediction[:, index]
-
-            return new_predictions
+            return _expand_prediction_array(prediction, np.unique(Y_train),
+                                            num_classes)
 
         return prediction
 
@@ -6,7 +6,8 @@ from smac.tae.execute_ta_run import TAEAbortException
 from sklearn.model_selection import ShuffleSplit, StratifiedShuffleSplit, KFold, \
     StratifiedKFold, train_test_split, PredefinedSplit
 
-from autosklearn.evaluation.abstract_evaluator import AbstractEvaluator
+from autosklearn.evaluation.abstract_evaluator import AbstractEvaluator, \
+    DeferredTestPrediction
 from autosklearn.constants import *
 
 
@@ -14,6 +15,10 @@ __all__ = ['TrainEvaluator', 'eval_holdout', 'eval_iterative_holdout',
            'eval_cv', 'eval_partial_cv', 'eval_partial_cv_iterative']
 
 
+# Minimal length of a learning curve which is extrapolated
+N_POINTS_FOR_EARLY_STOPPING = 4
+
+
 def _get_y_array(y, task_type):
     if task_type in CLASSIFICATION_TASKS and task_type != \
             MULTILABEL_CLASSIFICATION:
@@ -36,7 +41,10 @@ class TrainEvaluator(AbstractEvaluator):
                  include=None,
                  exclude=None,
                  disable_file_output=False,
-                 init_params=None):
+                 init_params=None,
+                 checkpoint=None,
+                 defer_test_predictions=False,
+                 rung=None):
         super().__init__(
             backend=backend,
             queue=queue,
@@ -51,11 +59,16 @@ class TrainEvaluator(AbstractEvaluator):
             exclude=exclude,
             disable_file_output=disable_file_output,
             init_params=init_params,
+            defer_test_predictions=defer_test_predictions,
         )
         self.resampling_strategy = resampling_strategy
         self.resampling_strategy_args = resampling_strategy_args
         self.cv = self.get_splitter(self.datamanager)
         self.cv_folds = self.cv.n_splits
+        # The test predictions of cross-validation average the models of all
+        # folds, which are not kept
+        if self.cv_folds > 1:
+            self.defer_test_predictions = False
         self.X_train = self.datamanager.data['X_train']
         self.Y_train = self.datamanager.data['Y_train']
         self.Y_optimization = None
@@ -69,6 +82,14 @@ class TrainEvaluator(AbstractEvaluator):
         # opposite.
         self.partial = True
         self.keep_models = keep_models
+        # If given, the state of an iterative fit is saved under this key
+        # after the last iteration, and a later run with a larger max_iter
+        # continues from it instead of starting from scratch
+        self.checkpoint = checkpoint
+        # If given, an iterative fit stops early once its learning curve is
+        # extrapolated to end up worse than the best loss announced for this
+        # rung (budget) by other runs
+        self.rung = rung
 
     def fit_predict_and_loss(self, max_iter=0):
         if max_iter != 0:
@@ -138,7 +159,7 @@ class TrainEvaluator(AbstractEvaluator):
             else:
                 Y_valid_pred = None
 
-            if self.X_test is not None:
+            if self.X_test is not None and not self.defer_test_predictions:
                 Y_test_pred = np.array([Y_test_pred[i]
                                         for i in range(self.cv_folds)
                                         if Y_test_pred[i] is not None])
@@ -223,11 +244,39 @@ class TrainEvaluator(AbstractEvaluator):
             file_output = True if self.cv_folds == 1 else False
 
             if model.estimator_supports_iterative_fit():
+                iteration = 1
+                total_n_iteration = 0
+                learning_curve = []
+                checkpoint_info = {}
+                state = None
+                if self.checkpoint is not None and self.cv_folds == 1:
+                    state = self.backend.load_checkpoint(self.checkpoint,
+                                                         max_iter)
+                    if state is not None and \
+                            state['model'].configuration_fully_fitted():
+                        state = None
+                    checkpoint_info['checkpoint'] = 'miss'
+                if state is not None:
+                    model = state['model']
+                    estimator = model.steps[-1][1].choice
+
+                # Re-fitting the preprocessing of a resumed model is
+                # deterministic, only the final estimator keeps its state
                 Xt, fit_params = model.fit_transformer(self.X_train[train_indices],
                                                        self.Y_train[train_indices])
 
-                iteration = 1
-                total_n_iteration = 0
+                if state is not None:
+                    # With class weighting, fit_transformer sets the
+                    # hyperparameters again, which creates a new, unfitted
+                    # estimator. The partially fitted one is put back.
+                    model.steps[-1][1].choice = estimator
+                    iteration = state['iteration']
+                    total_n_iteration = state['total_n_iteration']
+                    learning_curve = state.get('learning_curve', [])
+                    checkpoint_info['checkpoint'] = 'hit'
+                    checkpoint_info['resumed_at_iteration'] = \
+                        total_n_iteration
+
                 while (
                     not model.configuration_fully_fitted()
                     and (max_iter == -1 or max_iter > total_n_iteration)
@@ -244,14 +293,40 @@ class TrainEvaluator(AbstractEvaluator):
 
                     loss = self._loss(self.Y_train[test_indices], Y_optimization_pred)
                     additional_run_info = model.get_additional_run_info()
+                    if checkpoint_info:
+                        additional_run_info = dict(additional_run_info or {})
+                        additional_run_info.update(checkpoint_info)
+
+                    learning_curve.append((
+                        total_n_iteration,
+                        loss[self.metric.name] if isinstance(loss, dict)
+                        else loss,
+                    ))
 
                     if (
                         model.configuration_fully_fitted()
                         or (max_iter > 0 and total_n_iteration >= max_iter)
                     ):
                         final_call = True
+                    elif self._is_dominated(learning_curve, max_iter):
+                        final_call = True
+                        additional_run_info = dict(additional_run_info or {})
+                        additional_run_info['stopped_early_at_iteration'] = \
+                            total_n_iteration
                     else:
                         final_call = False
+
+                    if final_call and checkpoint_info:
+                        if model.configuration_fully_fitted():
+                            self.backend.delete_checkpoints(self.checkpoint)
+                        else:
+                            self.backend.save_checkpoint(
+                                {'model': model,
+                                 'iteration': iteration + 1,
+                                 'total_n_iteration': total_n_iteration,
+                                 'learning_curve': learning_curve},
+                                self.checkpoint, total_n_iteration,
+                            )
                     self.finish_up(
                         loss,
                         Y_optimization_pred,
@@ -261,6 +336,8 @@ class TrainEvaluator(AbstractEvaluator):
                         file_output=file_output,
                         final_call=final_call,
                     )
+                    if final_call:
+                        break
                     iteration += 1
 
                 return
@@ -308,6 +385,26 @@ class TrainEvaluator(AbstractEvaluator):
             additional_run_info = model.get_additional_run_info()
             return opt_pred, valid_pred, test_pred, additional_run_info
 
+    def _is_dominated(self, learning_curve, max_iter):
+        """Whether the learning curve, extrapolated to ``max_iter``
+        iterations, ends up worse than the best loss of the rung even if it
+        improves twice as fast as predicted."""
+        if self.rung is None or max_iter <= 0 or \
+                len(learning_curve) < N_POINTS_FOR_EARLY_STOPPING:
+            return False
+        best_loss = self.backend.get_best_rung_loss(self.rung)
+        if best_loss is None:
+            return False
+
+        from hpbandster.learning_curve_models.power_law import PowerLaw
+        times, losses = zip(*learning_curve)
+        mean, variance = PowerLaw().extend_partial([max_iter], times, losses)
+        optimistic_loss = mean[0] - 2 * np.sqrt(variance[0])
+        self.logger.debug('Extrapolated loss after %d iterations: %f, '
+                          'optimistic %f, best loss of the rung %f.',
+                          max_iter, mean[0], optimistic_loss, best_loss)
+        return optimistic_loss > best_loss
+
     def subsample_indices(self, train_indices):
         if self.subsample is not None:
             # Only subsample if there are more indices given to this method than
@@ -338,16 +435,19 @@ class TrainEvaluator(AbstractEvaluator):
                                          self.Y_train[train_indices])
 
         if self.X_valid is not None:
-            X_valid = self.X_valid.copy()
-            valid_pred = self.predict_function(X_valid, model,
+            valid_pred = self.predict_function(self.X_valid, model,
                                                self.task_type,
                                                self.Y_train[train_indices])
         else:
             valid_pred = None
 
-        if self.X_test is not None:
-            X_test = self.X_test.copy()
-            test_pred = self.predict_function(X_test, model,
+        if self.X_test is not None and self.defer_test_predictions:
+            self.test_predictor = DeferredTestPrediction(
+                self.task_type, self.datamanager.info['label_num'],
+                self.Y_train[train_indices])
+            test_pred = None
+        elif self.X_test is not None:
+            test_pred = self.predict_function(self.X_test, model,
                                               self.task_type,
                                               self.Y_train[train_indices])
         else:
@@ -433,10 +533,13 @@ def eval_holdout(
         exclude,
         disable_file_output,
         init_params=None,
+        defer_test_predictions=False,
 ):
     instance = json.loads(instance) if instance is not None else {}
     subsample = instance.get('subsample')
     max_iter = instance.get('max_iter', 0)
+    checkpoint = instance.get('checkpoint')
+    rung = instance.get('rung')
     evaluator = TrainEvaluator(
         backend=backend,
         queue=queue,
@@ -452,7 +555,10 @@ def eval_holdout(
         include=include,
         exclude=exclude,
         disable_file_output=disable_file_output,
-        init_params=init_params
+        init_params=init_params,
+        checkpoint=checkpoint,
+        defer_test_predictions=defer_test_predictions,
+        rung=rung,
     )
     evaluator.fit_predict_and_loss(max_iter=max_iter)
 
@@ -473,6 +579,7 @@ def eval_iterative_holdout(
         exclude,
         disable_file_output,
         init_params=None,
+        defer_test_predictions=False,
 ):
     instance = json.loads(instance) if instance is not None else {}
     instance['max_iter'] = -1
@@ -492,7 +599,8 @@ def eval_iterative_holdout(
         exclude=exclude,
         instance=instance,
         disable_file_output=disable_file_output,
-        init_params=init_params
+        init_params=init_params,
+        defer_test_predictions=defer_test_predictions,
     )
 
 
@@ -512,6 +620,7 @@ def eval_partial_cv(
         exclude,
         disable_file_output,
         init_params=None,
+        defer_test_predictions=False,
 ):
     instance = json.loads(instance) if instance is not None else {}
     subsample = instance.get('subsample')
@@ -534,6 +643,7 @@ def eval_partial_cv(
         exclude=exclude,
         disable_file_output=disable_file_output,
         init_params=init_params,
+        defer_test_predictions=defer_test_predictions,
     )
 
     evaluator.partial_fit_predict_and_loss(fold=fold, max_iter=max_iter)
@@ -555,6 +665,7 @@ def eval_partial_cv_iterative(
         exclude,
         disable_file_output,
         init_params=None,
+        defer_test_predictions=False,
 ):
     instance = json.loads(instance) if instance is not None else {}
     instance['max_iter'] = -1
@@ -575,6 +686,7 @@ def eval_partial_cv_iterative(
         exclude=exclude,
         disable_file_output=disable_file_output,
         init_params=init_params,
+        defer_test_predictions=defer_test_predictions,
     )
 
 
@@ -595,6 +707,7 @@ def eval_cv(
         exclude,
         disable_file_output,
         init_params=None,
+        defer_test_predictions=False,
 ):
     instance = json.loads(instance) if instance is not None else {}
     subsample = instance.get('subsample')
@@ -614,6 +727,7 @@ def eval_cv(
         exclude=exclude,
         disable_file_output=disable_file_output,
         init_params=init_params,
+        defer_test_predictions=defer_test_predictions,
     )
 
     evaluator.fit_predict_and_loss()
@@ -0,0 +1,254 @@
+# -*- encoding: utf-8 -*-
+"""Pool of long-lived evaluation processes.
+
+The pynisher forks a new process for every target algorithm run. For fast
+runs this overhead dominates, therefore the pool keeps a number of pre-warmed
+worker processes which hold the datamanager in memory and evaluate one job
+after another. The limits are enforced with the same mechanisms as in the
+pynisher (``RLIMIT_AS`` for the memory and ``SIGALRM`` for the wall clock
+time) and reported with the same exit status, so that the results can be
+interpreted by ``ExecuteTaFuncWithQueue`` in the exact same way. A worker
+which breached a limit or crashed is replaced by a fresh one.
+"""
+import contextlib
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import time
+
+import psutil
+from pynisher import TimeoutException, MemorylimitException, \
+    AnythingException
+
+from autosklearn.util.logging_ import get_logger
+
+
+__all__ = [
+    'EvaluationWorkerPool'
+]
+
+
+def _kill_children():
+    for child in psutil.Process().children(recursive=True):
+        try:
+            child.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+
+def _worker_loop(backend, conn, result_queue, mem_in_mb):
+    def handler(signum, frame):
+        raise TimeoutException
+
+    signal.signal(signal.SIGALRM, handler)
+
+    if mem_in_mb is not None:
+        mem_in_b = mem_in_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (mem_in_b, mem_in_b))
+
+    # Load the data once, every evaluator of this process re-uses it
+    backend.cache_datamanager()
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        func, kwargs, wall_time_in_s = job
+        try:
+            if wall_time_in_s is not None:
+                signal.alarm(wall_time_in_s)
+            return_value = (func(queue=result_queue, backend=backend,
+                                 **kwargs), 0)
+        except MemoryError:
+            return_value = (None, MemorylimitException)
+        except TimeoutException:
+            return_value = (None, TimeoutException)
+        except Exception:
+            return_value = (None, AnythingException)
+        finally:
+            signal.alarm(0)
+            _kill_children()
+
+        try:
+            conn.send(return_value)
+        except Exception:
+            break
+        # The state of a process which ran out of time or memory is
+        # undefined, let the pool replace it
+        if return_value[1] != 0:
+            break
+
+    conn.close()
+
+
+class _PoolWorker(object):
+    def __init__(self, backend, mem_in_mb, grace_period_in_s, logger):
+        self.mem_in_mb = mem_in_mb
+        self.grace_period_in_s = grace_period_in_s
+        self.logger = logger
+        self.usable = True
+
+        # Results of the target algorithm are communicated through this
+        # queue, it is inherited by the worker process
+        self.queue = multiprocessing.Queue()
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_loop,
+            name='evaluation pool worker',
+            args=(backend, child_conn, self.queue, mem_in_mb),
+        )
+        self.process.start()
+        child_conn.close()
+
+    def enforce_limits(self, wall_time_in_s=None):
+        """Drop-in replacement for ``pynisher.enforce_limits``.
+
+        The memory limit is the one of the pool. The arguments ``queue`` and
+        ``backend`` of the wrapped function are provided by the worker
+        process."""
+        worker = self
+
+        def decorator(func):
+
+            class function_wrapper(object):
+                def __init__(self, func):
+                    self.func = func
+                    self.result = None
+                    self.exit_status = None
+                    self.wall_clock_time = None
+
+                def __call__(self, **kwargs):
+                    kwargs.pop('queue', None)
+                    kwargs.pop('backend', None)
+                    start = time.time()
+                    self.result, self.exit_status = worker.run(
+                        self.func, kwargs, wall_time_in_s,
+                    )
+                    self.wall_clock_time = time.time() - start
+                    return self.result
+
+            return function_wrapper(func)
+
+        return decorator
+
+    def run(self, func, kwargs, wall_time_in_s):
+        if wall_time_in_s is not None:
+            wall_time_in_s = int(wall_time_in_s)
+        try:
+            self.conn.send((func, kwargs, wall_time_in_s))
+            if wall_time_in_s is None or \
+                    self.conn.poll(wall_time_in_s + self.grace_period_in_s):
+                result, exit_status = self.conn.recv()
+            else:
+                self.logger.debug('Pool worker %d did not respond in time, '
+                                  'killing it.', self.process.pid)
+                # Do not close the queue yet, the caller still reads the
+                # results reported so far
+                self._kill()
+                result, exit_status = None, TimeoutException
+        except (EOFError, OSError):
+            self.logger.debug('Pool worker %d closed the pipe prematurely, '
+                              'it probably got an uncatchable signal.',
+                              self.process.pid)
+            result, exit_status = None, AnythingException
+
+        if exit_status != 0:
+            self.usable = False
+        return result, exit_status
+
+    def drain_queue(self):
+        while True:
+            try:
+                self.queue.get(block=False)
+            except queue.Empty:
+                break
+
+    def shutdown(self):
+        try:
+            self.conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self.process.join(self.grace_period_in_s)
+        self.terminate()
+
+    def terminate(self):
+        self._kill()
+        self.conn.close()
+        self.queue.close()
+
+    def _kill(self):
+        if self.process.is_alive():
+            try:
+                for child in psutil.Process(self.process.pid).children(
+                        recursive=True):
+                    child.kill()
+            except psutil.NoSuchProcess:
+                pass
+            os.kill(self.process.pid, signal.SIGKILL)
+        self.process.join()
+
+
+class EvaluationWorkerPool(object):
+    """Keeps ``n_workers`` evaluation processes alive.
+
+    Parameters
+    ----------
+    backend : autosklearn.util.backend.Backend
+        The datamanager is loaded from this backend once per worker process.
+
+    n_workers : int
+        Number of worker processes. Each job occupies one worker, callers
+        block until one is idle.
+
+    mem_in_mb : int, optional
+        Memory limit of each worker process.
+
+    grace_period_in_s : int
+        Additional time given to a worker to report back before it is
+        killed.
+    """
+    def __init__(self, backend, n_workers=1, mem_in_mb=None,
+                 grace_period_in_s=5):
+        self.backend = backend
+        self.n_workers = n_workers
+        self.mem_in_mb = mem_in_mb
+        self.grace_period_in_s = grace_period_in_s
+        self.logger = get_logger(__name__)
+
+        self._idle = queue.Queue()
+        for i in range(n_workers):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        worker = _PoolWorker(backend=self.backend, mem_in_mb=self.mem_in_mb,
+                             grace_period_in_s=self.grace_period_in_s,
+                             logger=self.logger)
+        self.logger.debug('Started pool worker %d.', worker.process.pid)
+        return worker
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """Reserve an idle worker for one job.
+
+        The results of the job must be read from ``worker.queue`` before the
+        context is left."""
+        worker = self._idle.get()
+        try:
+            yield worker
+        finally:
+            if worker.usable:
+                worker.drain_queue()
+            else:
+                worker.terminate()
+                worker = self._start_worker()
+            self._idle.put(worker)
+
+    def shutdown(self):
+        for i in range(self.n_workers):
+            self._idle.get().shutdown()
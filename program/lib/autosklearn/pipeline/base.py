@@ -2,6 +2,7 @@ from abc import ABCMeta
 from collections import defaultdict
 
 import numpy as np
+import scipy.sparse
 from ConfigSpace import Configuration
 from sklearn.pipeline import Pipeline
 from sklearn.utils.validation import check_random_state, check_is_fitted
@@ -10,6 +11,14 @@ from .components.base import AutoSklearnChoice, AutoSklearnComponent
 import autosklearn.pipeline.create_searchspace_util
 
 
+def _may_share_memory(a, b):
+    if scipy.sparse.issparse(a) and scipy.sparse.issparse(b):
+        return np.may_share_memory(a.data, b.data)
+    elif scipy.sparse.issparse(a) or scipy.sparse.issparse(b):
+        return False
+    return np.may_share_memory(a, b)
+
+
 class BasePipeline(Pipeline):
     """Base class for all pipeline objects.
 
@@ -20,9 +29,11 @@ class BasePipeline(Pipeline):
 
     def __init__(self, config=None, pipeline=None, dataset_properties=None,
                  include=None, exclude=None, random_state=None,
-                 init_params=None):
+                 init_params=None, transform_cache=None):
 
         self._init_params = init_params if init_params is not None else {}
+        self.transform_cache = transform_cache
+        self._transform_key = None
         self.include_ = include if include is not None else {}
         self.exclude_ = exclude if exclude is not None else {}
         self.dataset_properties_ = dataset_properties if \
@@ -99,11 +110,72 @@ class BasePipeline(Pipeline):
             fit_params = {}
         fit_params = {key.replace(":", "__"): value for key, value in
                       fit_params.items()}
+
+        self._transform_key = None
+        if self.transform_cache is not None:
+            self._transform_key = self.transform_cache.get_key(self, X, y)
+        if self._transform_key is not None:
+            steps = self.transform_cache.load_steps(self._transform_key)
+            Xt = None
+            if steps is not None:
+                Xt = self.transform_cache.load(self._transform_key, X)
+            if Xt is not None:
+                self.steps[:-1] = steps
+                estimator_name = self.steps[-1][0]
+                fit_params = {
+                    key.split('__', 1)[1]: value
+                    for key, value in fit_params.items()
+                    if key.split('__', 1)[0] == estimator_name
+                }
+                return Xt, fit_params
+
         Xt, fit_params = self._fit(X, y, **fit_params)
         if fit_params is None:
             fit_params = {}
+        if self._transform_key is not None:
+            self.transform_cache.store(self._transform_key, X, Xt,
+                                       steps=self.steps[:-1])
         return Xt, fit_params
 
+    def _transform(self, X):
+        """Apply the transformer steps to X without changing X.
+
+        Copy-on-write: only a step which changes its input in place gets a
+        copy, and only if its input may still share memory with X. X can
+        therefore be read-only or memory-mapped."""
+        Xt = X
+        for name, transform in self.steps[:-1]:
+            if transform is None:
+                continue
+            if getattr(transform, 'mutates_input', False) and \
+                    _may_share_memory(Xt, X):
+                Xt = Xt.copy()
+            Xt = transform.transform(Xt)
+        return Xt
+
+    def _get_cached_transform(self, X):
+        """X transformed by the transformer steps, taken from the transform
+        cache. A miss is transformed and stored. Returns None if the
+        transformer steps have no cache entry or a miss can't be stored, X
+        is then better transformed batch by batch."""
+        if self._transform_key is None:
+            return None
+        Xt = self.transform_cache.load(self._transform_key, X)
+        if Xt is None:
+            if self.transform_cache.is_full():
+                return None
+            Xt = self._transform(X)
+            self.transform_cache.store(self._transform_key, X, Xt)
+        return Xt
+
+    def __getstate__(self):
+        # The transform cache belongs to the run which fitted the pipeline,
+        # a pickled pipeline transforms its input itself
+        state = super().__getstate__()
+        state['transform_cache'] = None
+        state['_transform_key'] = None
+        return state
+
     def fit_estimator(self, X, y, **fit_params):
         fit_params = {key.replace(":", "__"): value for key, value in
                       fit_params.items()}
@@ -137,8 +209,15 @@ class BasePipeline(Pipeline):
         array, shape=(n_samples,) if n_classes == 2 else (n_samples, n_classes)
             Returns the predicted values"""
 
+        Xt = self._get_cached_transform(X)
+        if Xt is None:
+            def predict(X):
+                return self._final_estimator.predict(self._transform(X))
+        else:
+            X, predict = Xt, self._final_estimator.predict
+
         if batch_size is None:
-            return super().predict(X).astype(self._output_dtype)
+            return predict(X).astype(self._output_dtype)
         else:
             if not isinstance(batch_size, int):
                 raise ValueError("Argument 'batch_size' must be of type int, "
@@ -160,7 +239,8 @@ class BasePipeline(Pipeline):
                     batch_from = k * batch_size
                     batch_to = min([(k + 1) * batch_size, X.shape[0]])
                     y[batch_from:batch_to] = \
-                        self.predict(X[batch_from:batch_to], batch_size=None)
+                        predict(X[batch_from:batch_to]).astype(
+                            self._output_dtype)
 
                 return y
 
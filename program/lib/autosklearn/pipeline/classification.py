@@ -50,6 +50,10 @@ class SimpleClassificationPipeline(ClassifierMixin, BasePipeline):
         If None, the random number generator is the RandomState instance
         used by `np.random`.
 
+    transform_cache : autosklearn.pipeline.transform_cache.TransformCache, optional
+        If given, the fitted data preprocessing steps and the data transformed
+        by them are re-used from and stored in this cache.
+
     Attributes
     ----------
     _estimator : The underlying scikit-learn classification model. This
@@ -76,11 +80,11 @@ class SimpleClassificationPipeline(ClassifierMixin, BasePipeline):
 
     def __init__(self, config=None, pipeline=None, dataset_properties=None,
                  include=None, exclude=None, random_state=None,
-                 init_params=None):
+                 init_params=None, transform_cache=None):
         self._output_dtype = np.int32
         super().__init__(
             config, pipeline, dataset_properties, include, exclude,
-            random_state, init_params)
+            random_state, init_params, transform_cache)
 
     def fit_transformer(self, X, y, fit_params=None):
 
@@ -121,8 +125,15 @@ class SimpleClassificationPipeline(ClassifierMixin, BasePipeline):
         -------
         array, shape=(n_samples,) if n_classes == 2 else (n_samples, n_classes)
         """
+        Xt = self._get_cached_transform(X)
+        if Xt is None:
+            def predict_proba(X):
+                return self._final_estimator.predict_proba(self._transform(X))
+        else:
+            X, predict_proba = Xt, self._final_estimator.predict_proba
+
         if batch_size is None:
-            return super().predict_proba(X)
+            return predict_proba(X)
 
         else:
             if not isinstance(batch_size, int):
@@ -134,7 +145,7 @@ class SimpleClassificationPipeline(ClassifierMixin, BasePipeline):
 
             else:
                 # Probe for the target array dimensions
-                target = self.predict_proba(X[0:2].copy())
+                target = predict_proba(X[0:2].copy())
 
                 y = np.zeros((X.shape[0], target.shape[1]),
                              dtype=np.float32)
@@ -144,8 +155,7 @@ class SimpleClassificationPipeline(ClassifierMixin, BasePipeline):
                     batch_from = k * batch_size
                     batch_to = min([(k + 1) * batch_size, X.shape[0]])
                     y[batch_from:batch_to] = \
-                        self.predict_proba(X[batch_from:batch_to],
-                                           batch_size=None).\
+                        predict_proba(X[batch_from:batch_to]).\
                             astype(np.float32)
 
                 return y
@@ -61,6 +61,10 @@ class ThirdPartyComponents(object):
 
 
 class AutoSklearnComponent(BaseEstimator):
+    # Components whose transform changes its input in place must set this to
+    # True, the pipeline then passes them a copy if the input is not its own
+    mutates_input = False
+
     @staticmethod
     def get_properties(dataset_properties=None):
         """Get the properties of the underlying algorithm.
@@ -311,6 +315,10 @@ class AutoSklearnChoice(object):
         # self.set_hyperparameters(self.configuration)
         self.choice = None
 
+    @property
+    def mutates_input(self):
+        return self.choice is not None and self.choice.mutates_input
+
     def get_components(cls):
         raise NotImplementedError()
 
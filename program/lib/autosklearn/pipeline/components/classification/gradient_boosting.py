@@ -1,5 +1,4 @@
 import numpy as np
-import sklearn.ensemble
 
 from ConfigSpace.configuration_space import ConfigurationSpace
 from ConfigSpace.hyperparameters import UniformFloatHyperparameter, \
@@ -47,6 +46,7 @@ class GradientBoostingClassifier(AutoSklearnClassificationAlgorithm):
         return self
 
     def iterative_fit(self, X, y, sample_weight=None, n_iter=1, refit=False):
+        import sklearn.ensemble
 
         # Special fix for gradient boosting!
         if isinstance(X, np.ndarray):
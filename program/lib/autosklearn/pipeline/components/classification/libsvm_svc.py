@@ -11,9 +11,6 @@ from autosklearn.pipeline.constants import *
 from autosklearn.pipeline.implementations.util import softmax
 from autosklearn.util.common import check_for_bool, check_none
 
-from scipy.sparse import issparse
-from sklearn.decomposition import PCA, TruncatedSVD
-
 
 class LibSVM_SVC(AutoSklearnClassificationAlgorithm):
     def __init__(self, C, kernel, gamma, shrinking, tol, max_iter,
@@ -31,7 +28,9 @@ class LibSVM_SVC(AutoSklearnClassificationAlgorithm):
         self.estimator = None
 
     def fit(self, X, Y):
+        from scipy.sparse import issparse
         import sklearn.svm
+        from sklearn.decomposition import PCA, TruncatedSVD
 
         try:
             soft, hard = resource.getrlimit(resource.RLIMIT_AS)
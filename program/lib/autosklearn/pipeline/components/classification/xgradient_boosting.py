@@ -10,7 +10,6 @@ from ConfigSpace.conditions import EqualsCondition
 
 from autosklearn.pipeline.components.base import \
     AutoSklearnClassificationAlgorithm
-from autosklearn.pipeline.implementations.xgbclassifier import CustomXGBClassifier
 from autosklearn.pipeline.constants import *
 
 
@@ -104,6 +103,8 @@ class XGradientBoostingClassifier(AutoSklearnClassificationAlgorithm):
         return self
 
     def iterative_fit(self, X, y, n_iter=2, refit=False, sample_weight=None):
+        from autosklearn.pipeline.implementations.xgbclassifier import \
+            CustomXGBClassifier
 
         if refit:
             self.estimator = None
@@ -184,9 +185,15 @@ class XGradientBoostingClassifier(AutoSklearnClassificationAlgorithm):
             self.estimator.n_estimators += n_iter
             self.estimator.n_estimators = min(self.estimator.n_estimators,
                                               self.n_estimators)
-            self.estimator.fit(X, y, xgb_model=self.estimator.get_booster(),
+            self.estimator.fit(X, y,
+                               xgb_model=self.estimator.get_boosters()[-1],
                                sample_weight=sample_weight)
 
+        # Data predicted on in between two iterations (holdout, test) is
+        # kept so that the next iteration only adds the new trees to it
+        self.estimator.cache_predictions = \
+            not self.configuration_fully_fitted()
+
         return self
 
     def configuration_fully_fitted(self):
@@ -6,6 +6,9 @@ from autosklearn.pipeline.constants import *
 
 
 class Imputation(AutoSklearnPreprocessingAlgorithm):
+    # The preprocessor is created with copy=False
+    mutates_input = True
+
     def __init__(self, strategy='median', random_state=None):
         self.strategy = strategy
 
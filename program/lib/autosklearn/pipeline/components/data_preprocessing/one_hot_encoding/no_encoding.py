@@ -32,6 +32,7 @@ class NoEncoding(AutoSklearnPreprocessingAlgorithm):
                 'handles_multilabel': True,
                 'handles_sparse': True,
                 'handles_dense': True,
+                'is_deterministic': True,
                 'input': (DENSE, SPARSE, UNSIGNED_DATA),
                 'output': (INPUT,)}
 
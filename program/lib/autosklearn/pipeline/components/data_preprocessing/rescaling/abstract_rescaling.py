@@ -3,6 +3,8 @@ from ConfigSpace.configuration_space import ConfigurationSpace
 
 class Rescaling(object):
     # Rescaling does not support fit_transform (as of 0.19.1)!
+    # The preprocessors of all subclasses are created with copy=False
+    mutates_input = True
 
     def fit(self, X, y=None):
         self.preprocessor.fit(X)
@@ -5,6 +5,8 @@ from autosklearn.pipeline.components.base import AutoSklearnPreprocessingAlgorit
 
 
 class NoRescalingComponent(Rescaling, AutoSklearnPreprocessingAlgorithm):
+    mutates_input = False
+
     def __init__(self, random_state):
         pass
 
@@ -11,6 +11,9 @@ from autosklearn.pipeline.constants import *
 
 
 class Nystroem(AutoSklearnPreprocessingAlgorithm):
+    # Negative values are clipped in place for the chi2 kernel
+    mutates_input = True
+
     def __init__(self, kernel, n_components, gamma=1.0, degree=3,
                  coef0=1, random_state=None):
         self.kernel = kernel
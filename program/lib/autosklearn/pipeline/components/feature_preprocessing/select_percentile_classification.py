@@ -8,6 +8,8 @@ from autosklearn.pipeline.constants import *
 
 class SelectPercentileClassification(SelectPercentileBase,
                                      AutoSklearnPreprocessingAlgorithm):
+    # Negative values are clipped in place for the chi2 score function
+    mutates_input = True
 
     def __init__(self, percentile, score_func="chi2", random_state=None):
         """ Parameters:
@@ -8,6 +8,9 @@ from autosklearn.pipeline.constants import *
 
 
 class SelectRates(AutoSklearnPreprocessingAlgorithm):
+    # Negative values are clipped in place for the chi2 score function
+    mutates_input = True
+
     def __init__(self, alpha, mode='fpr',
                  score_func="chi2", random_state=None):
         import sklearn.feature_selection
@@ -1,6 +1,9 @@
+import collections
+import hashlib
 import warnings
 
 import numpy as np
+import scipy.sparse
 
 from xgboost import XGBModel, callback, rabit
 from xgboost.core import DMatrix, XGBoostError, Booster, STRING_TYPES, \
@@ -9,10 +12,57 @@ from xgboost.compat import (XGBClassifierBase, XGBLabelEncoder)
 from xgboost.sklearn import _objective_decorator
 
 
+def _fingerprint(*arrays):
+    """Hash the content of the given arrays.
+
+    The pipeline hands new (transformed, batched) copies of the same data to
+    the classifier on every call, the object identity can therefore not be
+    used to recognize data whose margins are cached."""
+    hasher = hashlib.sha1()
+    for array in arrays:
+        if array is None:
+            hasher.update(b'None')
+            continue
+        if scipy.sparse.issparse(array):
+            array = array.tocsr()
+            parts = (array.data, array.indices, array.indptr)
+        else:
+            parts = (np.asarray(array), )
+        for part in parts:
+            part = np.ascontiguousarray(part)
+            hasher.update(str((part.shape, part.dtype.str)).encode())
+            hasher.update(part.data)
+    return hasher.hexdigest()
+
+
+def _sigmoid(margin):
+    return 1.0 / (1.0 + np.exp(-margin))
+
+
+def _softmax(margin):
+    prob = np.exp(margin - np.max(margin, axis=1, keepdims=True))
+    return prob / np.sum(prob, axis=1, keepdims=True)
+
+
+# Objectives whose prediction is a transformation of the summed margins of
+# all trees. Only models with these objectives are continued by chaining
+# boosters, see CustomXGBClassifier.fit
+_MARGIN_TRANSFORMS = {
+    'binary:logistic': _sigmoid,
+    'multi:softprob': _softmax,
+}
+
+
 class CustomXGBClassifier(XGBModel, XGBClassifierBase):
     # pylint: disable=missing-docstring,too-many-arguments,invalid-name
     __doc__ = """Implementation of the scikit-learn API for XGBoost classification.
 
+    A model which is trained further by passing the last of its boosters
+    (see ``get_boosters``) as ``xgb_model`` to ``fit`` consists of a chain of
+    boosters, each holding only the trees added by one call to ``fit``.
+    ``get_booster`` raises an XGBoostError for such a model, as no single
+    booster describes it.
+
     """ + '\n'.join(XGBModel.__doc__.split('\n')[2:])
 
     def __init__(self, max_depth=3, learning_rate=0.1,
@@ -37,6 +87,23 @@ class CustomXGBClassifier(XGBModel, XGBClassifierBase):
             random_state, seed, missing,
             **kwargs
         )
+        # Set by the caller while the model is trained further. The margins
+        # of every input predicted on are then kept, so that the next
+        # prediction only evaluates the trees added in between.
+        self.cache_predictions = False
+        self._boosters = []
+        self._booster_rounds = []
+        self._train_cache = None
+        self._margin_cache = collections.OrderedDict()
+        self._requested_margins = set()
+
+    def __getstate__(self):
+        # DMatrix objects hold ctypes pointers and can't be pickled
+        state = self.__dict__.copy()
+        state['_train_cache'] = None
+        state['_margin_cache'] = collections.OrderedDict()
+        state['_requested_margins'] = set()
+        return state
 
     def fit(self, X, y, sample_weight=None, eval_set=None, eval_metric=None,
             early_stopping_rounds=None, verbose=True, xgb_model=None):
@@ -78,7 +145,11 @@ class CustomXGBClassifier(XGBModel, XGBClassifierBase):
             metric measured on the validation set to stderr.
         xgb_model : str
             file name of stored xgb model or 'Booster' instance Xgb model to be
-            loaded before training (allows training continuation).
+            loaded before training (allows training continuation). If it is
+            the last booster returned by ``get_boosters``, the model is
+            continued by training an additional booster on the margins of the
+            previous ones instead, which neither re-loads nor re-evaluates
+            their trees.
         """
         evals_result = {}
         self.classes_ = np.unique(y)
@@ -108,6 +179,16 @@ class CustomXGBClassifier(XGBModel, XGBClassifierBase):
         self._le = XGBLabelEncoder().fit(y)
         training_labels = self._le.transform(y)
 
+        # The trees of a booster are only additive for gbtree and gblinear,
+        # dart scales the previous trees when adding new ones
+        chain = (
+            xgb_model is not None
+            and self._boosters
+            and xgb_model is self._boosters[-1]
+            and self.booster != 'dart'
+            and xgb_options['objective'] in _MARGIN_TRANSFORMS
+        )
+
         if eval_set is not None:
             # TODO: use sample_weight if given?
             evals = list(
@@ -115,6 +196,12 @@ class CustomXGBClassifier(XGBModel, XGBClassifierBase):
                         missing=self.missing, nthread=self.n_jobs)
                 for x in eval_set
             )
+            if chain:
+                for x, eval_dmatrix in zip(eval_set, evals):
+                    eval_dmatrix.set_base_margin(
+                        self._add_margins(DMatrix(x[0], missing=self.missing,
+                                                  nthread=self.n_jobs)).ravel()
+                    )
             nevals = len(evals)
             eval_names = ["validation_{}".format(i) for i in range(nevals)]
             evals = list(zip(evals, eval_names))
@@ -123,21 +210,61 @@ class CustomXGBClassifier(XGBModel, XGBClassifierBase):
 
         self._features_count = X.shape[1]
 
-        if sample_weight is not None:
+        train_key = _fingerprint(X, training_labels, sample_weight)
+        if chain and self._train_cache is not None and \
+                self._train_cache[0] == train_key:
+            train_dmatrix, train_margin = self._train_cache[1:]
+        else:
             train_dmatrix = DMatrix(X, label=training_labels,
                                     weight=sample_weight,
                                     missing=self.missing, nthread=self.n_jobs)
+            train_margin = None
+            if chain:
+                train_margin = self._add_margins(
+                    DMatrix(X, missing=self.missing, nthread=self.n_jobs))
+
+        if chain:
+            # Boost from the margins of the previous boosters, the new
+            # booster only holds the additional trees
+            start_round = sum(self._booster_rounds)
+            train_dmatrix.set_base_margin(train_margin.ravel())
+            # A new booster re-seeds the random number generator, without an
+            # offset it would draw the same subsamples as the first one
+            xgb_options['seed'] += len(self._boosters)
+            booster = train(xgb_options, train_dmatrix,
+                            self.n_estimators - start_round,
+                            evals=evals,
+                            early_stopping_rounds=early_stopping_rounds,
+                            evals_result=evals_result, obj=obj, feval=feval,
+                            verbose_eval=verbose)
+            self._boosters.append(booster)
+            # Margins of inputs not predicted on since the last call won't
+            # be needed any more
+            for key in list(self._margin_cache):
+                if key not in self._requested_margins:
+                    del self._margin_cache[key]
         else:
-            train_dmatrix = DMatrix(X, label=training_labels,
-                                    missing=self.missing, nthread=self.n_jobs)
-
-        self._Booster = train(xgb_options, train_dmatrix, self.n_estimators,
-                              evals=evals,
-                              early_stopping_rounds=early_stopping_rounds,
-                              evals_result=evals_result, obj=obj, feval=feval,
-                              # Only the last kwarg in of this call was
-                              # changed in this file!!!
-                              verbose_eval=verbose, xgb_model=xgb_model)
+            start_round = 0
+            booster = train(xgb_options, train_dmatrix, self.n_estimators,
+                            evals=evals,
+                            early_stopping_rounds=early_stopping_rounds,
+                            evals_result=evals_result, obj=obj, feval=feval,
+                            # Only the last kwarg in of this call was
+                            # changed in this file!!!
+                            verbose_eval=verbose, xgb_model=xgb_model)
+            self._boosters = [booster]
+            self._booster_rounds = []
+            self._margin_cache = collections.OrderedDict()
+        self._Booster = booster
+        self._booster_rounds.append(booster.best_iteration + 1)
+        self._requested_margins = set()
+
+        # The booster caches the predictions for its training data, which
+        # are the margins the next booster of the chain starts from
+        self._train_cache = (
+            train_key, train_dmatrix,
+            booster.predict(train_dmatrix, output_margin=True),
+        )
 
         self.objective = xgb_options["objective"]
         if evals_result:
@@ -149,16 +276,123 @@ class CustomXGBClassifier(XGBModel, XGBClassifierBase):
 
         if early_stopping_rounds is not None:
             self.best_score = self._Booster.best_score
-            self.best_iteration = self._Booster.best_iteration
-            self.best_ntree_limit = self._Booster.best_ntree_limit
+            self.best_iteration = self._Booster.best_iteration + start_round
+            self.best_ntree_limit = self._Booster.best_ntree_limit + \
+                start_round * xgb_options.get('num_parallel_tree', 1)
 
         return self
 
+    def get_boosters(self):
+        """Get the chain of xgboost Boosters of this model.
+
+        This will raise an exception when fit was not called
+
+        Returns
+        -------
+        boosters : list of the xgboost boosters of the underlying model, the
+            output of the model is the sum of their margins
+        """
+        if not self._boosters:
+            raise XGBoostError('need to call fit beforehand')
+        return list(self._boosters)
+
+    def get_booster(self):
+        """Get the underlying xgboost Booster of this model.
+
+        This will raise an exception when fit was not called or the model
+        consists of a chain of boosters
+
+        Returns
+        -------
+        booster : a xgboost booster of underlying model
+        """
+        if len(self._boosters) > 1:
+            raise XGBoostError(
+                'The model consists of a chain of %d boosters, use '
+                'get_boosters instead' % len(self._boosters))
+        return super(CustomXGBClassifier, self).get_booster()
+
+    @property
+    def feature_importances_(self):
+        """
+        Returns
+        -------
+        feature_importances_ : array of shape = [n_features], summed over
+            all boosters of the model
+
+        """
+        boosters = self.get_boosters()
+        all_features = np.zeros(len(boosters[0].feature_names),
+                                dtype=np.float32)
+        for booster in boosters:
+            fs = booster.get_fscore()
+            all_features += [fs.get(f, 0.) for f in booster.feature_names]
+        return all_features / all_features.sum()
+
+    def _add_margins(self, dmatrix, margin=None, start=0, ntree_limit=0):
+        """Add the output of the boosters from ``start`` on to ``margin``.
+
+        ``margin`` is the output of the boosters before ``start``, or None if
+        ``start`` is 0. ``ntree_limit`` limits the number of boosting rounds
+        over all boosters."""
+        remaining_rounds = ntree_limit
+        for booster, n_rounds in zip(self._boosters[start:],
+                                     self._booster_rounds[start:]):
+            if ntree_limit > 0:
+                if remaining_rounds <= 0:
+                    break
+                booster_ntree_limit = min(remaining_rounds, n_rounds)
+                remaining_rounds -= n_rounds
+            else:
+                booster_ntree_limit = 0
+            if margin is not None:
+                dmatrix.set_base_margin(margin.ravel())
+            margin = booster.predict(dmatrix, output_margin=True,
+                                     ntree_limit=booster_ntree_limit)
+        return margin
+
+    def _predict_margin(self, data, ntree_limit=0):
+        # Margins are only cached for models which are continued by chaining
+        if ntree_limit > 0 or self.booster == 'dart' or \
+                (not self.cache_predictions and not self._margin_cache):
+            test_dmatrix = DMatrix(data, missing=self.missing,
+                                   nthread=self.n_jobs)
+            return self._add_margins(test_dmatrix, ntree_limit=ntree_limit)
+
+        key = _fingerprint(data)
+        if key in self._margin_cache:
+            test_dmatrix, margin, start = self._margin_cache[key]
+        elif self.cache_predictions:
+            test_dmatrix = DMatrix(data, missing=self.missing,
+                                   nthread=self.n_jobs)
+            margin, start = None, 0
+        else:
+            test_dmatrix = DMatrix(data, missing=self.missing,
+                                   nthread=self.n_jobs)
+            return self._add_margins(test_dmatrix)
+
+        if start < len(self._boosters):
+            margin = self._add_margins(test_dmatrix, margin, start)
+            self._margin_cache[key] = (test_dmatrix, margin,
+                                       len(self._boosters))
+        self._requested_margins.add(key)
+        return margin
+
+    def _predict_class_probs(self, data, output_margin, ntree_limit):
+        if self.objective not in _MARGIN_TRANSFORMS:
+            test_dmatrix = DMatrix(data, missing=self.missing,
+                                   nthread=self.n_jobs)
+            return self.get_booster().predict(test_dmatrix,
+                                              output_margin=output_margin,
+                                              ntree_limit=ntree_limit)
+        margin = self._predict_margin(data, ntree_limit=ntree_limit)
+        if output_margin:
+            return margin
+        return _MARGIN_TRANSFORMS[self.objective](margin)
+
     def predict(self, data, output_margin=False, ntree_limit=0):
-        test_dmatrix = DMatrix(data, missing=self.missing, nthread=self.n_jobs)
-        class_probs = self.get_booster().predict(test_dmatrix,
-                                                 output_margin=output_margin,
-                                                 ntree_limit=ntree_limit)
+        class_probs = self._predict_class_probs(data, output_margin,
+                                                ntree_limit)
         if len(class_probs.shape) > 1:
             column_indexes = np.argmax(class_probs, axis=1)
         else:
@@ -167,10 +401,8 @@ class CustomXGBClassifier(XGBModel, XGBClassifierBase):
         return self._le.inverse_transform(column_indexes)
 
     def predict_proba(self, data, output_margin=False, ntree_limit=0):
-        test_dmatrix = DMatrix(data, missing=self.missing, nthread=self.n_jobs)
-        class_probs = self.get_booster().predict(test_dmatrix,
-                                                 output_margin=output_margin,
-                                                 ntree_limit=ntree_limit)
+        class_probs = self._predict_class_probs(data, output_margin,
+                                                ntree_limit)
         if self.objective == "multi:softprob":
             return class_probs
         else:
@@ -47,6 +47,10 @@ class SimpleRegressionPipeline(RegressorMixin, BasePipeline):
         If None, the random number generator is the RandomState instance
         used by `np.random`.
 
+    transform_cache : autosklearn.pipeline.transform_cache.TransformCache, optional
+        If given, the fitted data preprocessing steps and the data transformed
+        by them are re-used from and stored in this cache.
+
     Attributes
     ----------
     _estimator : The underlying scikit-learn regression model. This
@@ -72,13 +76,13 @@ class SimpleRegressionPipeline(RegressorMixin, BasePipeline):
     """
     def __init__(self, config=None, pipeline=None, dataset_properties=None,
                  include=None, exclude=None, random_state=None,
-                 init_params=None):
+                 init_params=None, transform_cache=None):
         self._output_dtype = np.float32
         super().__init__(
             config=config, pipeline=pipeline,
             dataset_properties=dataset_properties,
             include=include, exclude=exclude, random_state=random_state,
-            init_params=init_params)
+            init_params=init_params, transform_cache=transform_cache)
 
     def fit_estimator(self, X, y, **fit_params):
         self.y_max_ = np.nanmax(y)
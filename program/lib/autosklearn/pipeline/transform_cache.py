@@ -0,0 +1,211 @@
+"""Content-addressed cache of data transformed by the data preprocessing of a
+pipeline.
+
+Most configurations evaluated on a dataset share the same data preprocessing
+(encoding, imputation, rescaling, balancing) and only differ in the
+classifier. The cache stores the fitted transformer steps of a pipeline and
+every matrix transformed by them on disk. An entry is keyed by the content of
+the training data and the hyperparameters of the transformer steps, so a
+later pipeline with the same prefix restores the fitted steps and skips
+straight to its final estimator. Matrices are memory-mapped when read.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import scipy.sparse
+
+from autosklearn.pipeline.components.base import AutoSklearnChoice
+from autosklearn.util.hash import hash_array_or_matrix
+
+
+__all__ = [
+    'TransformCache'
+]
+
+
+def _is_deterministic(node):
+    if isinstance(node, AutoSklearnChoice):
+        node = node.choice
+    return node.get_properties().get('is_deterministic', False)
+
+
+class TransformCache(object):
+    """Store of fitted transformer steps and the data transformed by them.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the cache, it is shared by all processes evaluating
+        configurations on the same data.
+
+    max_size_in_mb : int, optional (default=1024)
+        No new matrices are stored once the cache holds this many megabytes.
+        If None, the size of the cache is not limited.
+
+    Notes
+    -----
+    Every store appends the number of bytes it wrote to a size file in the
+    cache directory. The size of the cache is the sum of that file, of which
+    each process only reads the lines appended since it last looked.
+    """
+    def __init__(self, directory, max_size_in_mb=1024):
+        self.directory = directory
+        self.max_size_in_mb = max_size_in_mb
+        self._size = 0
+        self._size_offset = 0
+
+    def get_key(self, pipeline, X, y):
+        """Key of the transformer steps of ``pipeline`` fitted on ``X`` and
+        ``y``. Returns None if a step does not transform the data
+        deterministically, the result of fitting them can't be re-used
+        then."""
+        steps = pipeline.steps[:-1]
+        if not steps or not all(_is_deterministic(node)
+                                for name, node in steps):
+            return None
+
+        prefixes = tuple('%s:' % name for name, node in steps)
+        hyperparameters = sorted(
+            (param, str(value)) for param, value in
+            pipeline.configuration.get_dictionary().items()
+            if param.startswith(prefixes)
+        )
+        init_params = sorted(
+            (param, str(value)) for param, value in
+            pipeline._init_params.items() if param.startswith(prefixes)
+        )
+
+        m = hashlib.md5()
+        m.update(type(pipeline).__name__.encode('utf8'))
+        m.update(str(hyperparameters).encode('utf8'))
+        m.update(str(init_params).encode('utf8'))
+        m.update(hash_array_or_matrix(X).encode('utf8'))
+        m.update(hash_array_or_matrix(np.asarray(y)).encode('utf8'))
+        return m.hexdigest()
+
+    def _get_entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def _get_steps_filename(self, key):
+        return os.path.join(self._get_entry_dir(key), 'steps.pkl')
+
+    def _get_size_filename(self):
+        return os.path.join(self.directory, 'size')
+
+    def _get_matrix_dir(self, key, X):
+        return os.path.join(self._get_entry_dir(key), hash_array_or_matrix(X))
+
+    def load_steps(self, key):
+        """Fitted transformer steps of ``key``, or None."""
+        try:
+            with open(self._get_steps_filename(key), 'rb') as fh:
+                return pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def load(self, key, X):
+        """``X`` transformed by the steps of ``key``, or None."""
+        matrix_dir = self._get_matrix_dir(key, X)
+        try:
+            if os.path.exists(os.path.join(matrix_dir, 'X.npy')):
+                # Copy-on-write, the estimator may modify its input in place
+                return np.load(os.path.join(matrix_dir, 'X.npy'),
+                               mmap_mode='c')
+            shape = np.load(os.path.join(matrix_dir, 'shape.npy'))
+            data, indices, indptr = [
+                np.load(os.path.join(matrix_dir, '%s.npy' % part),
+                        mmap_mode='c')
+                for part in ('data', 'indices', 'indptr')
+            ]
+        except OSError:
+            return None
+        return scipy.sparse.csr_matrix((data, indices, indptr),
+                                       shape=tuple(shape), copy=False)
+
+    def is_full(self):
+        """Whether no new matrices are stored."""
+        return self.max_size_in_mb is not None and \
+            self._get_size_in_mb() >= self.max_size_in_mb
+
+    def store(self, key, X, Xt, steps=None):
+        """Store ``Xt``, which is ``X`` transformed by the steps of ``key``.
+
+        The fitted ``steps`` are stored along if given. Nothing is stored if
+        the cache is full, failing to write is not an error either."""
+        if self.is_full():
+            return
+        try:
+            entry_dir = self._get_entry_dir(key)
+            os.makedirs(entry_dir, exist_ok=True)
+            size = 0
+            if steps is not None and \
+                    not os.path.exists(self._get_steps_filename(key)):
+                with tempfile.NamedTemporaryFile('wb', dir=entry_dir,
+                                                 delete=False) as fh:
+                    pickle.dump(steps, fh, -1)
+                    tempname = fh.name
+                size += os.path.getsize(tempname)
+                os.rename(tempname, self._get_steps_filename(key))
+            size += self._store_matrix(self._get_matrix_dir(key, X), Xt)
+            self._add_size(size)
+        except OSError:
+            pass
+
+    def _store_matrix(self, matrix_dir, Xt):
+        # Returns the number of bytes written
+        if os.path.exists(matrix_dir):
+            return 0
+        # Another process may store the same matrix at the same time, the
+        # directory only appears once it is complete
+        tempdir = tempfile.mkdtemp(dir=os.path.dirname(matrix_dir))
+        try:
+            if scipy.sparse.issparse(Xt):
+                Xt = Xt.tocsr()
+                np.save(os.path.join(tempdir, 'data.npy'), Xt.data)
+                np.save(os.path.join(tempdir, 'indices.npy'), Xt.indices)
+                np.save(os.path.join(tempdir, 'indptr.npy'), Xt.indptr)
+                np.save(os.path.join(tempdir, 'shape.npy'),
+                        np.array(Xt.shape))
+            else:
+                Xt = np.asarray(Xt)
+                if Xt.dtype.hasobject:
+                    # Can't be memory-mapped
+                    shutil.rmtree(tempdir, ignore_errors=True)
+                    return 0
+                np.save(os.path.join(tempdir, 'X.npy'), Xt)
+            size = sum(os.path.getsize(os.path.join(tempdir, filename))
+                       for filename in os.listdir(tempdir))
+            os.rename(tempdir, matrix_dir)
+        except OSError:
+            shutil.rmtree(tempdir, ignore_errors=True)
+            return 0
+        return size
+
+    def _add_size(self, size):
+        if size == 0:
+            return
+        # A single write to a file opened for appending is atomic, lines of
+        # concurrent processes don't interleave
+        fd = os.open(self._get_size_filename(),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, b'%d\n' % size)
+        finally:
+            os.close(fd)
+
+    def _get_size_in_mb(self):
+        try:
+            with open(self._get_size_filename(), 'rb') as fh:
+                fh.seek(self._size_offset)
+                data = fh.read()
+        except OSError:
+            data = b''
+        # Skip a line which is still being written
+        end = data.rfind(b'\n') + 1
+        self._size += sum(int(size) for size in data[:end].split())
+        self._size_offset += end
+        return self._size / 1024 / 1024
@@ -15,6 +15,10 @@ __all__ = [
 ]
 
 
+# Number of rows of predictions formatted at once
+PREDICTION_CHUNK_SIZE = 65536
+
+
 def create(temporary_directory,
            output_directory,
            delete_tmp_folder_after_terminate=True,
@@ -124,6 +128,7 @@ class Backend(object):
         self.internals_directory = os.path.join(self.temporary_directory,
                                                 ".auto-sklearn")
         self._make_internals_directory()
+        self._datamanager = None
 
     @property
     def output_directory(self):
@@ -237,27 +242,76 @@ class Backend(object):
     def _get_datamanager_pickle_filename(self):
         return os.path.join(self.internals_directory, 'datamanager.pkl')
 
+    def _get_datamanager_array_filename(self, key):
+        return os.path.join(self.internals_directory,
+                            'datamanager_%s.npy' % key)
+
     def save_datamanager(self, datamanager):
+        """Persist the datamanager.
+
+        Dense numerical arrays in ``datamanager.data`` are written as raw
+        ``.npy`` files so that ``load_datamanager`` can memory-map them, only
+        the remaining attributes are pickled."""
         self._make_internals_directory()
         filepath = self._get_datamanager_pickle_filename()
 
         lock_path = filepath + '.lock'
         with lockfile.LockFile(lock_path):
             if not os.path.exists(filepath):
-                with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(
-                        filepath), delete=False) as fh:
-                    pickle.dump(datamanager, fh, -1)
-                    tempname = fh.name
+                arrays = {
+                    key: value for key, value in datamanager.data.items()
+                    if isinstance(value, np.ndarray) and
+                    not value.dtype.hasobject
+                }
+                for key, array in arrays.items():
+                    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(
+                            filepath), delete=False) as fh:
+                        np.save(fh, array, allow_pickle=False)
+                        tempname = fh.name
+                    os.rename(tempname,
+                              self._get_datamanager_array_filename(key))
+
+                # Pickle the datamanager with placeholders instead of the
+                # arrays, restore them afterwards
+                try:
+                    for key in arrays:
+                        datamanager.data[key] = None
+                    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(
+                            filepath), delete=False) as fh:
+                        pickle.dump(datamanager, fh, -1)
+                        tempname = fh.name
+                finally:
+                    datamanager.data.update(arrays)
                 os.rename(tempname, filepath)
 
         return filepath
 
     def load_datamanager(self):
+        """Load the datamanager with read-only memory-mapped data arrays.
+
+        All files are written atomically by ``save_datamanager`` and never
+        changed afterwards, therefore no lock is needed for reading."""
+        if self._datamanager is not None:
+            return self._datamanager
+
         filepath = self._get_datamanager_pickle_filename()
-        lock_path = filepath + '.lock'
-        with lockfile.LockFile(lock_path):
-            with open(filepath, 'rb') as fh:
-                return pickle.load(fh)
+        with open(filepath, 'rb') as fh:
+            datamanager = pickle.load(fh)
+
+        for key, value in datamanager.data.items():
+            if value is None:
+                array_filepath = self._get_datamanager_array_filename(key)
+                if os.path.exists(array_filepath):
+                    datamanager.data[key] = np.load(array_filepath,
+                                                    mmap_mode='r')
+        return datamanager
+
+    def cache_datamanager(self):
+        """Keep the datamanager resident in the current process.
+
+        All subsequent calls to ``load_datamanager`` return the same object,
+        which must therefore not be modified."""
+        self._datamanager = self.load_datamanager()
 
     def get_model_dir(self):
         return os.path.join(self.internals_directory, 'models')
@@ -274,6 +328,114 @@ class Backend(object):
 
         os.rename(tempname, filepath)
 
+    def get_checkpoint_dir(self):
+        return os.path.join(self.internals_directory, 'checkpoints')
+
+    def get_transform_cache_dir(self):
+        return os.path.join(self.internals_directory, 'transform_cache')
+
+    def _get_checkpoint_filename(self, key, n_iter):
+        return os.path.join(self.get_checkpoint_dir(),
+                            '%s.%d.checkpoint' % (key, n_iter))
+
+    def _list_checkpoints(self, key):
+        checkpoints = []
+        for filepath in glob.glob(os.path.join(self.get_checkpoint_dir(),
+                                               '%s.*.checkpoint' % key)):
+            n_iter = int(os.path.basename(filepath).split('.')[-2])
+            checkpoints.append((n_iter, filepath))
+        return sorted(checkpoints)
+
+    def save_checkpoint(self, checkpoint, key, n_iter):
+        """Save the state of a partially fitted model after ``n_iter``
+        iterations, checkpoints of ``key`` with fewer iterations are
+        superseded and removed."""
+        try:
+            os.makedirs(self.get_checkpoint_dir())
+        except OSError:
+            pass
+
+        filepath = self._get_checkpoint_filename(key, n_iter)
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(
+                filepath), delete=False) as fh:
+            pickle.dump(checkpoint, fh, -1)
+            tempname = fh.name
+        os.rename(tempname, filepath)
+
+        for n_iter_, filepath_ in self._list_checkpoints(key):
+            if n_iter_ < n_iter:
+                try:
+                    os.remove(filepath_)
+                except OSError:
+                    pass
+
+    def delete_checkpoints(self, key):
+        """Delete all checkpoints of ``key``, e.g. once its model won't be
+        fitted any further."""
+        for n_iter, filepath in self._list_checkpoints(key):
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+
+    def load_checkpoint(self, key, max_iter=-1):
+        """Load the checkpoint of ``key`` with the most iterations, but less
+        than ``max_iter`` (unless it is -1). Returns None if there is no such
+        checkpoint."""
+        for n_iter, filepath in reversed(self._list_checkpoints(key)):
+            if max_iter != -1 and n_iter >= max_iter:
+                continue
+            try:
+                with open(filepath, 'rb') as fh:
+                    return pickle.load(fh)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                # Removed by a concurrent save_checkpoint
+                continue
+        return None
+
+    def get_test_predictor_dir(self):
+        return os.path.join(self.internals_directory, 'test_predictors')
+
+    def _get_test_predictor_filename(self, automl_seed, idx):
+        return os.path.join(self.get_test_predictor_dir(),
+                            '%s.%s.predictor' % (automl_seed, str(idx)))
+
+    def save_test_predictor(self, predictor, automl_seed, idx):
+        """Save the object which predicts the test set of a run whose test
+        predictions were deferred."""
+        try:
+            os.makedirs(self.get_test_predictor_dir())
+        except OSError:
+            pass
+
+        filepath = self._get_test_predictor_filename(automl_seed, idx)
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(
+                filepath), delete=False) as fh:
+            pickle.dump(predictor, fh, -1)
+            tempname = fh.name
+        os.rename(tempname, filepath)
+
+    def get_test_predictor_mtime(self, automl_seed, idx):
+        """Modification time in nanoseconds of the test predictor of a run,
+        None if there is none. A run announced again replaces its predictor,
+        the time identifies the version."""
+        try:
+            return os.stat(self._get_test_predictor_filename(
+                automl_seed, idx)).st_mtime_ns
+        except OSError:
+            return None
+
+    def load_test_predictor(self, automl_seed, idx):
+        with open(self._get_test_predictor_filename(automl_seed, idx),
+                  'rb') as fh:
+            return pickle.load(fh)
+
+    def delete_test_predictor(self, automl_seed, idx):
+        try:
+            os.remove(self._get_test_predictor_filename(automl_seed, idx))
+        except OSError:
+            pass
+
     def list_all_models(self, seed):
         model_directory = self.get_model_dir()
         if seed >= 0:
@@ -329,6 +491,13 @@ class Backend(object):
         with open(model_file_path, 'rb') as fh:
             return pickle.load(fh)
 
+    def delete_model(self, seed, idx):
+        try:
+            os.remove(os.path.join(self.get_model_dir(),
+                                   '%s.%s.model' % (seed, idx)))
+        except OSError:
+            pass
+
     def get_ensemble_dir(self):
         return os.path.join(self.internals_directory, 'ensembles')
 
@@ -381,12 +550,95 @@ class Backend(object):
         filepath = os.path.join(output_dir, 'predictions_%s_%s_%s.npy' %
                                             (subset, automl_seed, str(idx)))
 
+        # A plain .npy file, the ensemble builder memory-maps it
         with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(
                 filepath), delete=False) as fh:
-            pickle.dump(predictions.astype(np.float32), fh, -1)
+            np.save(fh, predictions.astype(np.float32))
             tempname = fh.name
         os.rename(tempname, filepath)
 
+    def _get_predictions_manifest_filename(self):
+        return os.path.join(self.internals_directory, 'predictions_manifest')
+
+    def announce_predictions(self, automl_seed, idx):
+        """Append a run to the predictions manifest.
+
+        Must be called after all predictions of the run were saved. The
+        manifest is append-only and every entry is written with a single
+        ``write`` on a file opened with ``O_APPEND``, therefore entries of
+        concurrent evaluations do not interleave and no lock is needed."""
+        self._make_internals_directory()
+        line = ('%s %s\n' % (automl_seed, str(idx))).encode()
+        fd = os.open(self._get_predictions_manifest_filename(),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def get_predictions_manifest_size(self):
+        try:
+            return os.path.getsize(self._get_predictions_manifest_filename())
+        except OSError:
+            return 0
+
+    def read_predictions_manifest(self, offset=0):
+        """Read the runs announced after byte ``offset`` of the manifest.
+
+        Returns
+        -------
+        entries : list
+            List of ``(automl_seed, idx)`` string tuples, ``idx`` as used in
+            the names of the prediction files.
+
+        offset : int
+            Offset to continue reading from. An incomplete last line is not
+            consumed."""
+        try:
+            with open(self._get_predictions_manifest_filename(), 'rb') as fh:
+                fh.seek(offset)
+                data = fh.read()
+        except FileNotFoundError:
+            return [], offset
+
+        end = data.rfind(b'\n') + 1
+        entries = [tuple(line.split()) for line in
+                   data[:end].decode().splitlines()]
+        return entries, offset + end
+
+    def _get_rung_losses_filename(self):
+        return os.path.join(self.internals_directory, 'rung_losses')
+
+    def announce_rung_loss(self, rung, loss):
+        """Append the final loss of a run on budget ``rung`` to a file shared
+        by all workers. Entries are written like those of the predictions
+        manifest."""
+        self._make_internals_directory()
+        line = ('%s %r\n' % (rung, float(loss))).encode()
+        fd = os.open(self._get_rung_losses_filename(),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def get_best_rung_loss(self, rung):
+        """Lowest loss announced for budget ``rung``, None if there is
+        none."""
+        try:
+            with open(self._get_rung_losses_filename(), 'rb') as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            return None
+
+        losses = []
+        # An incomplete last line is ignored
+        for line in data[:data.rfind(b'\n') + 1].decode().splitlines():
+            rung_, loss = line.split()
+            if rung_ == str(rung):
+                losses.append(float(loss))
+        return min(losses) if losses else None
+
     def save_predictions_as_txt(self, predictions, subset, idx, precision,
                                 prefix=None):
         # Write prediction scores in prescribed format
@@ -394,15 +646,18 @@ class Backend(object):
                                 ('%s_' % prefix if prefix else '') +
                                  '%s.predict' % (subset))
 
-        format_string = '{:.%dg} ' % precision
+        predictions = np.asarray(predictions, dtype=np.float64)
+        if predictions.ndim == 1:
+            predictions = predictions.reshape((-1, 1))
+        # Every value is followed by a space, every row by a newline. A whole
+        # chunk of rows is formatted by a single % operation.
+        row_format = '%%.%dg ' % precision * predictions.shape[1] + '\n'
         with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(
                 filepath), delete=False) as output_file:
-            for row in predictions:
-                if not isinstance(row, np.ndarray) and not isinstance(row, list):
-                    row = [row]
-                for val in row:
-                    output_file.write(format_string.format(float(val)))
-                output_file.write('\n')
+            for start in range(0, predictions.shape[0], PREDICTION_CHUNK_SIZE):
+                chunk = predictions[start:start + PREDICTION_CHUNK_SIZE]
+                output_file.write(row_format * chunk.shape[0] %
+                                  tuple(chunk.ravel().tolist()))
             tempname = output_file.name
         os.rename(tempname, filepath)
 
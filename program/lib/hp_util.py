@@ -1,7 +1,9 @@
 import copy
+import hashlib
 import logging
 import json
 import multiprocessing
+import threading
 import unittest.mock
 
 import autosklearn
@@ -14,7 +16,9 @@ import ConfigSpace.util
 from hpbandster.core.worker import Worker
 from hpbandster.core.master import Master
 from hpbandster.iterations.base import BaseIteration
+from hpbandster.iterations import AsynchronousSuccessiveHalving
 from hpbandster.config_generators.bohb import BOHB
+from hpbandster.config_generators.encoding import ConfigurationEncoder
 import numpy as np
 from smac.stats.stats import Stats
 from smac.tae.execute_ta_run import StatusType
@@ -24,6 +28,9 @@ N_KEEP_DATA = 30000
 TA_MEMORY_LIMIT = 6000
 N_FOLDS = 10
 MIN_N_DATA_FOR_SH = 1000
+# Cutoffs from the runtime model stay within this factor of the cutoff
+# proportional to the budget
+RUNTIME_CUTOFF_RANGE = 4
 
 
 class Dummy(object):
@@ -31,6 +38,65 @@ class Dummy(object):
         self.name = 'Dummy'
 
 
+class RuntimeModel(object):
+    """Online model of the runtime of each classifier on this dataset.
+
+    Per classifier, the log runtime is a ridge regression on the log number
+    of data points, features and iterations of a run. It is shared by all
+    workers of a process, which observe every run they finish.
+
+    Parameters
+    ----------
+    min_observations : int
+        A classifier needs this many runs before its runtime is predicted.
+
+    alpha : float
+        Regularization strength of the ridge regression.
+    """
+    def __init__(self, min_observations=5, alpha=1e-2):
+        self.min_observations = min_observations
+        self.alpha = alpha
+        self._observations = {}
+        self._fits = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_features(n_samples, n_features, n_iterations):
+        return np.concatenate((
+            [1], np.log([n_samples, n_features, max(n_iterations, 1)])))
+
+    def observe(self, classifier, n_samples, n_features, n_iterations,
+                runtime):
+        with self._lock:
+            self._observations.setdefault(classifier, []).append((
+                self._get_features(n_samples, n_features, n_iterations),
+                np.log(max(runtime, 1e-3)),
+            ))
+            self._fits.pop(classifier, None)
+
+    def predict(self, classifier, n_samples, n_features, n_iterations):
+        """Returns the predicted runtime in seconds and an upper bound two
+        standard deviations above it, or None if the classifier has too few
+        observations."""
+        with self._lock:
+            observations = self._observations.get(classifier, [])
+            if len(observations) < self.min_observations:
+                return None
+            if classifier not in self._fits:
+                X = np.array([features for features, _ in observations])
+                y = np.array([log_runtime for _, log_runtime in observations])
+                # Within a dataset some features hardly vary, don't penalize
+                # the intercept
+                penalty = self.alpha * np.eye(X.shape[1])
+                penalty[0, 0] = 0
+                w = np.linalg.solve(X.T.dot(X) + penalty, X.T.dot(y))
+                std = np.sqrt(np.mean((y - X.dot(w)) ** 2))
+                self._fits[classifier] = w, std
+            w, std = self._fits[classifier]
+        mean = self._get_features(n_samples, n_features, n_iterations).dot(w)
+        return np.exp(mean), np.exp(mean + 2 * std)
+
+
 class AutoMLWorker(Worker):
     def __init__(self, dataset_name, n_data_points, backend, total_budget,
                  total_time, shuffle=True,
@@ -38,7 +104,9 @@ class AutoMLWorker(Worker):
                  include = {    'classifier': [ 'xgradient_boosting', 'sgd', 'random_forest', 'libsvm_svc' ],
                                 'preprocessor': [ 'no_preprocessing'],
                             },
-                 counter=2, use_backup_budgets=False,
+                 counter=2, use_backup_budgets=False, worker_pool=None,
+                 memory_limit=TA_MEMORY_LIMIT, early_stopping=False,
+                 n_features=None, runtime_model=None,
                  *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.logger = logging.getLogger(
@@ -46,6 +114,8 @@ class AutoMLWorker(Worker):
         )
 
         self.n_data_points = n_data_points
+        self.n_features = n_features
+        self.memory_limit = memory_limit
         self.total_budget = total_budget
         self.total_time = total_time
         self.shuffle = shuffle
@@ -132,7 +202,11 @@ class AutoMLWorker(Worker):
             'Reduced it to a %d-dimensional configuration space.',
             len(self.reduced_config_space.get_hyperparameters()),
         )
-            
+        # Turns the configurations of the reduced space into configurations
+        # of the full space
+        self.encoder = ConfigurationEncoder(self.config_space,
+                                            constants=self.constant_values)
+
         # Counter of 1 is the dummy prediction!
         self.counter = counter
 
@@ -141,21 +215,74 @@ class AutoMLWorker(Worker):
 
         self.backend = backend
         self.queue = multiprocessing.Queue()
+        # If given, runs are evaluated by the long-lived processes of this
+        # EvaluationWorkerPool instead of a new pynisher process per run
+        self.worker_pool = worker_pool
+        # Stop iterative fits whose learning curve is extrapolated to end up
+        # worse than the best loss seen on the same budget
+        self.early_stopping = early_stopping
+        # If given, a RuntimeModel shared with the other workers which sets
+        # the cutoff of each run
+        self.runtime_model = runtime_model
+
+    def _get_run_size(self, classifier, budget):
+        """Number of data points, features and iterations of a run of
+        ``classifier`` on ``budget``."""
+        if self.n_data_points > int(N_KEEP_DATA * 1.5):
+            n_data_points = N_KEEP_DATA
+        else:
+            n_data_points = self.n_data_points
+        n_features = self.n_features if self.n_features is not None else 1
+        budget = self.budget_converter[classifier](budget)
+
+        if n_data_points < MIN_N_DATA_FOR_SH:
+            return n_data_points, n_features, 1
+        elif self.modes[classifier] == 'iterations':
+            return n_data_points, n_features, budget
+        else:
+            return int(budget * n_data_points), n_features, 1
+
+    def predict_runtime(self, config, budget):
+        """Predicted runtime in seconds of ``config`` on ``budget``, None if
+        it can't be predicted yet."""
+        classifier = config.get('classifier:__choice__')
+        if self.runtime_model is None or classifier not in self.modes:
+            return None
+        prediction = self.runtime_model.predict(
+            classifier, *self._get_run_size(classifier, budget))
+        return prediction[0] if prediction is not None else None
+
+    def _get_configuration(self, config):
+        if 'rescaling:quantile_transformer:n_quantiles' in config and \
+                config['rescaling:quantile_transformer:n_quantiles'] > 2000:
+            config['rescaling:quantile_transformer:n_quantiles'] = 2000
+
+        # add the constants back in and deactivate the inactive
+        # parameters
+        return Configuration(self.config_space,
+                             vector=self.encoder.encode(config))
+
+    @staticmethod
+    def _get_checkpoint_key(config, subsample):
+        return hashlib.sha1(json.dumps(
+            [config.get_dictionary(), subsample],
+            sort_keys=True, default=str).encode()).hexdigest()
+
+    def delete_checkpoint(self, config):
+        """Delete the checkpoint of ``config``, which is not run on a larger
+        budget anymore."""
+        if self.n_data_points > int(N_KEEP_DATA * 1.5):
+            subsample = N_KEEP_DATA
+        else:
+            subsample = None
+        self.backend.delete_checkpoints(self._get_checkpoint_key(
+            self._get_configuration(dict(config)), subsample))
 
     def compute(self, config=None, budget=1, working_directory='/tmp'):
         if config is None:
             config = self.config_space.sample_configuration()
         else:
-            if 'rescaling:quantile_transformer:n_quantiles' in config and \
-                    config['rescaling:quantile_transformer:n_quantiles'] > 2000:
-                config['rescaling:quantile_transformer:n_quantiles'] = 2000
-
-            # add the constants back in
-            config.update(self.constant_values)
-            # and deactivate the inactive parameters
-            config = ConfigSpace.util.deactivate_inactive_hyperparameters(
-                                configuration_space=self.config_space,
-                                configuration=config)
+            config = self._get_configuration(config)
 
         classifier = config['classifier:__choice__']
 
@@ -207,19 +334,41 @@ class AutoMLWorker(Worker):
             output_y_hat_optimization=True,
             include=self.include,
             exclude=None,
-            memory_limit=TA_MEMORY_LIMIT,
+            memory_limit=self.memory_limit,
             disable_file_output=False,
             init_params=None,
+            worker_pool=self.worker_pool,
+            # Only the ensemble builder predicts the test set, for the models
+            # it selects
+            defer_test_predictions=True,
             **kwargs
         )
 
         mode = self.modes[classifier]
+        run_size = self._get_run_size(classifier, budget)
+        if self.runtime_model is not None:
+            prediction = self.runtime_model.predict(classifier, *run_size)
+            if prediction is not None:
+                cutoff = np.clip(prediction[1],
+                                 cutoff / RUNTIME_CUTOFF_RANGE,
+                                 cutoff * RUNTIME_CUTOFF_RANGE)
+                self.logger.info('Predicted runtime %f, using a cutoff of '
+                                 '%f.', prediction[0], cutoff)
+        # Losses on the same budget are only comparable with the same budget
+        # conversion, which depends on the classifier
+        rung = '%s:%s:%r' % (self.use_backup_budgets, classifier, budget)
         budget = self.budget_converter[classifier](budget)
 
         if resampling_strategy == 'cv':
             pass
         elif mode == 'iterations':
             instance['max_iter'] = budget
+            # A configuration promoted to the next budget continues the
+            # iterative fit of its previous run
+            instance['checkpoint'] = self._get_checkpoint_key(
+                config, instance.get('subsample'))
+            if self.early_stopping:
+                instance['rung'] = rung
         elif mode == 'subsets':
             budget = int(budget * n_data_points)
             instance['subsample'] = budget
@@ -236,6 +385,13 @@ class AutoMLWorker(Worker):
         )
         self.counter += 1
 
+        if self.runtime_model is not None:
+            if status == StatusType.SUCCESS:
+                self.runtime_model.observe(classifier, *run_size, runtime)
+            elif status == StatusType.TIMEOUT:
+                # The run would have taken longer than its cutoff
+                self.runtime_model.observe(classifier, *run_size, 2 * cutoff)
+
         if status != StatusType.SUCCESS:
             cost = float('inf')
         # Never advance a support vector machine if we do iterations,
@@ -244,6 +400,8 @@ class AutoMLWorker(Worker):
             mode=='iterations':
                 cost = float('inf')
 
+        if self.early_stopping and np.isfinite(cost):
+            self.backend.announce_rung_loss(rung, cost)
 
         return ({
             'loss': cost,
@@ -261,8 +419,12 @@ class AutoMLWorker(Worker):
 
 class PortfolioBOHB(BOHB):
     """ subclasses the config_generator BOHB"""
-    def __init__(self, initial_configs=None, *args, **kwargs):
+    def __init__(self, initial_configs=None, runtime_predictor=None,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Callable returning the predicted runtime of a configuration on a
+        # budget or None, used to run the fastest portfolio members first
+        self.runtime_predictor = runtime_predictor
 
         if initial_configs is None:
             # dummy initial portfolio
@@ -274,17 +436,44 @@ class PortfolioBOHB(BOHB):
 
         # return a portfolio member first
         if len(self.initial_configs) > 0 and True:
-            c = self.initial_configs.pop()
+            c = self.initial_configs.pop(self._get_next_portfolio_index(budget))
             return (c, {'portfolio_member': True})
 
         return (super().get_config(budget))
 
+    def _get_next_portfolio_index(self, budget):
+        # Running the shortest members first completes the most of them
+        # within the time limit. Members without a prediction go first to
+        # get one, ties keep the order of the portfolio (last to first).
+        if self.runtime_predictor is None:
+            return -1
+        runtimes = [self.runtime_predictor(c, budget)
+                    for c in self.initial_configs]
+        runtimes = [0 if r is None else r for r in runtimes]
+        return min(range(len(runtimes)), key=lambda i: (runtimes[i], -i))
+
     def new_result(self, job):
         # notify ensemble script or something
         super().new_result(job)
 
 class SuccessivePanicking(BaseIteration):
 
+    def __init__(self, *args, checkpoint_deleter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Callable deleting the checkpoint of a configuration, called for
+        # the configurations which are not advanced to the next budget
+        self.checkpoint_deleter = checkpoint_deleter
+
+    def process_results(self):
+        budget = self.budgets[self.stage]
+        config_ids = [cid for cid, d in self.data.items()
+                      if d.budget == budget and d.status in ('REVIEW', 'CRASHED')]
+        super().process_results()
+        if self.checkpoint_deleter is not None:
+            for cid in config_ids:
+                if self.data[cid].status != 'QUEUED':
+                    self.checkpoint_deleter(self.data[cid].config)
+
     def _advance_to_next_stage(self, config_ids, losses):
         """
             SuccessiveHalving simply continues the best based on the current loss.
@@ -306,19 +495,23 @@ class SideShowBOHB(Master):
                  eta=3, min_budget=0.01, max_budget=1,
                  min_points_in_model=None, top_n_percent=15,
                  num_samples=64, random_fraction=0.5, bandwidth_factor=3,
-                 SH_only=False,
-                 *args, **kwargs):
+                 refit_every_n_results=1, refit_every_n_seconds=None,
+                 SH_only=False, asynchronous=False, runtime_predictor=None,
+                 checkpoint_deleter=None, *args, **kwargs):
         # MF I changed the parameters a bit to be more aggressive after the
         # portfolio evaluation, but also to still do some random search.
 
         cg = PortfolioBOHB(
                      initial_configs=initial_configs,
+                     runtime_predictor=runtime_predictor,
                      configspace=configspace,
                      min_points_in_model=min_points_in_model,
                      top_n_percent=top_n_percent,
                      num_samples=num_samples,
                      random_fraction=random_fraction,
                      bandwidth_factor=bandwidth_factor,
+                     refit_every_n_results=refit_every_n_results,
+                     refit_every_n_seconds=refit_every_n_seconds,
                      )
 
         super().__init__(config_generator=cg, *args, **kwargs)
@@ -329,6 +522,10 @@ class SideShowBOHB(Master):
         self.max_budget = max_budget
 
         self.SH_only = SH_only
+        self.checkpoint_deleter = checkpoint_deleter
+        # Advance configurations as soon as they rank in the top 1/eta of
+        # their stage instead of waiting for the whole stage to finish
+        self.asynchronous = asynchronous
 
         # precompute some HB stuff
         self.max_SH_iter = -int(
@@ -348,7 +545,10 @@ class SideShowBOHB(Master):
             'top_n_percent': top_n_percent,
             'num_samples': num_samples,
             'random_fraction': random_fraction,
-            'bandwidth_factor': bandwidth_factor
+            'bandwidth_factor': bandwidth_factor,
+            'refit_every_n_results': refit_every_n_results,
+            'refit_every_n_seconds': refit_every_n_seconds,
+            'asynchronous': asynchronous,
         })
 
     def get_next_iteration(self, iteration, iteration_kwargs={}):
@@ -375,10 +575,20 @@ class SideShowBOHB(Master):
         n0 = int(np.floor((self.max_SH_iter) / (s + 1)) * self.eta ** s)
         ns = [max(int(n0 * (self.eta ** (-i))), 1) for i in range(s + 1)]
 
+        if self.asynchronous:
+            return AsynchronousSuccessiveHalving(
+                HPB_iter=iteration,
+                num_configs=ns,
+                budgets=self.budgets[(-s - 1):],
+                config_sampler=self.config_generator.get_config,
+                eta=self.eta,
+                **iteration_kwargs)
+
         return SuccessivePanicking(HPB_iter=iteration,
                                  num_configs=ns,
                                  budgets=self.budgets[(-s - 1):],
                                  config_sampler=self.config_generator.get_config,
+                                 checkpoint_deleter=self.checkpoint_deleter,
                                  **iteration_kwargs)
 
 
@@ -1,16 +1,54 @@
+import bisect
 import logging
 from copy import deepcopy
+import time
 import traceback
 
 
-import ConfigSpace
-import ConfigSpace.util
 import numpy as np
 import scipy.stats as sps
 import scipy.optimize as spo
-import statsmodels.api as sm
 
 from hpbandster.config_generators.base import base_config_generator
+from hpbandster.config_generators.encoding import ConfigurationEncoder
+
+
+def kde_pdf(kde, data_predict):
+	"""
+		Vectorized version of statsmodels' KDEMultivariate.pdf
+
+		Evaluates the product kernel density (Gaussian kernel for continuous,
+		Aitchison-Aitken kernel for unordered variables) at all points at
+		once instead of looping over them in Python.
+
+		Parameters:
+		-----------
+		kde: statsmodels.nonparametric.KDEMultivariate
+			the fitted density, only 'c' and 'u' variable types are supported
+		data_predict: numpy.ndarray
+			the points to evaluate, shape (num_points, num_dims)
+
+		returns: numpy.ndarray
+			the density for every point, shape (num_points,)
+	"""
+	data = kde.data
+	data_predict = np.atleast_2d(data_predict)
+	dens = np.ones((data_predict.shape[0], data.shape[0]))
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		for i, (bw, t) in enumerate(zip(kde.bw, kde.var_type)):
+			if t == 'c':
+				diff = data_predict[:, i, None] - data[None, :, i]
+				dens *= (1. / np.sqrt(2 * np.pi)) * np.exp(-diff**2 / (bw**2 * 2.)) / bw
+			elif t == 'u':
+				# like statsmodels, the number of levels is taken from the data
+				num_levels = np.unique(data[:, i]).size
+				same = data_predict[:, i, None] == data[None, :, i]
+				dens *= np.where(same, 1 - bw, bw / (num_levels - 1))
+			else:
+				raise ValueError('Unsupported variable type %s' % t)
+
+	return dens.sum(axis=1) / data.shape[0]
 
 
 class BOHB(base_config_generator):
@@ -18,6 +56,7 @@ class BOHB(base_config_generator):
 	def __init__(self, configspace, min_points_in_model = None,
 				 top_n_percent=15, num_samples = 64, random_fraction=1/3,
 				 bandwidth_factor=3, min_bandwidth=1e-3,
+				 refit_every_n_results=1, refit_every_n_seconds=None,
 				**kwargs):
 		"""
 			Fits for each given budget a kernel density estimator on the best N percent of the
@@ -43,6 +82,12 @@ class BOHB(base_config_generator):
 			min_bandwidth: float
 				to keep diversity, even when all (good) samples have the same value for one of the parameters,
 				a minimum bandwidth (Default: 1e-3) is used instead of zero. 
+			refit_every_n_results: int
+				debounces the model updates: the KDEs of a budget are refit at most once per this many
+				new results on the budget (Default: 1, i.e. after every result)
+			refit_every_n_seconds: float
+				if given, the KDEs are also refit when this many seconds passed since the last refit,
+				even if fewer than refit_every_n_results results arrived
 
 		"""
 		super().__init__(**kwargs)
@@ -61,6 +106,8 @@ class BOHB(base_config_generator):
 		
 		self.num_samples = num_samples
 		self.random_fraction = random_fraction
+		self.refit_every_n_results = refit_every_n_results
+		self.refit_every_n_seconds = refit_every_n_seconds
 
 		hps = self.configspace.get_hyperparameters()
 
@@ -78,6 +125,9 @@ class BOHB(base_config_generator):
 		
 		self.vartypes = np.array(self.vartypes, dtype=int)
 
+		# converts the sampled vectors to configurations and back
+		self.encoder = ConfigurationEncoder(self.configspace)
+
 		# store precomputed probs for the categorical parameters
 		self.cat_probs = []
 		
@@ -86,6 +136,15 @@ class BOHB(base_config_generator):
 		self.losses = dict()
 		self.good_config_rankings = dict()
 		self.kde_models = dict()
+
+		# incremental model store, per budget:
+		# the (loss, index) pairs kept sorted as the results arrive,
+		self.loss_order = dict()
+		# the indices of the configs the current good/bad KDEs are fit on
+		self.kde_members = dict()
+		# and the debouncing state of the refits
+		self.results_since_refit = dict()
+		self.last_refit_time = dict()
 		
 	def get_config(self, budget):
 		"""
@@ -109,7 +168,7 @@ class BOHB(base_config_generator):
 		# If no model is available, sample from prior
 		# also mix in a fraction of random configs
 		if len(self.kde_models.keys()) == 0 or np.random.rand() < self.random_fraction:
-			sample =  self.configspace.sample_configuration()
+			sample =  self.configspace.sample_configuration().get_dictionary()
 			info_dict['model_based_pick'] = False
 
 		best = np.inf
@@ -120,113 +179,144 @@ class BOHB(base_config_generator):
 				#sample from largest budget
 				budget = max(self.kde_models.keys())
 
-				l = self.kde_models[budget]['good'].pdf
-				g = self.kde_models[budget]['bad' ].pdf
-			
-				minimize_me = lambda x: max(1e-8, g(x))/max(l(x), 1e-8)
-				
 				kde_good = self.kde_models[budget]['good']
 				kde_bad = self.kde_models[budget]['bad']
 
-				for i in range(self.num_samples):
-					idx = np.random.randint(0, len(kde_good.data))
-					datum = kde_good.data[idx]
-					vector = []
-					
-					for m,bw,t in zip(datum, kde_good.bw, self.vartypes):
-						
-						bw = max(bw, self.min_bandwidth)
-						if t == 0:
-							bw = self.bw_factor*bw
-							try:
-								vector.append(sps.truncnorm.rvs(-m/bw,(1-m)/bw, loc=m, scale=bw))
-							except:
-								self.logger.warning("Truncated Normal failed for:\ndatum=%s\nbandwidth=%s\nfor entry with value %s"%(datum, kde_good.bw, m))
-								self.logger.warning("data in the KDE:\n%s"%kde_good.data)
-						else:
-							
-							if np.random.rand() < (1-bw):
-								vector.append(int(m))
-							else:
-								vector.append(np.random.randint(t))
-					
-					val = minimize_me(vector)
-
-					if not np.isfinite(val):
-						self.logger.warning('sampled vector: %s has EI value %s'%(vector, val))
-						self.logger.warning("data in the KDEs:\n%s\n%s"%(kde_good.data, kde_bad.data))
-						self.logger.warning("bandwidth of the KDEs:\n%s\n%s"%(kde_good.bw, kde_bad.bw))
-						self.logger.warning("l(x) = %s"%(l(vector)))
-						self.logger.warning("g(x) = %s"%(g(vector)))
-
-						# right now, this happens because a KDE does not contain all values for a categorical parameter
-						# this cannot be fixed with the statsmodels KDE, so for now, we are just going to evaluate this one
-						# if the good_kde has a finite value, i.e. there is no config with that value in the bad kde, so it shouldn't be terrible.
-						if np.isfinite(l(vector)):
-							best_vector = vector
-							break
-
-					if val < best:
-						best = val
-						best_vector = vector
+				vectors = self.sample_from_kde(kde_good, self.num_samples)
+				l = kde_pdf(kde_good, vectors)
+				g = kde_pdf(kde_bad, vectors)
+				vals = np.maximum(g, 1e-8) / np.maximum(l, 1e-8)
+
+				not_finite = np.flatnonzero(~np.isfinite(vals))
+				if len(not_finite) > 0:
+					i = not_finite[0]
+					self.logger.warning('sampled vector: %s has EI value %s'%(vectors[i], vals[i]))
+					self.logger.warning("data in the KDEs:\n%s\n%s"%(kde_good.data, kde_bad.data))
+					self.logger.warning("bandwidth of the KDEs:\n%s\n%s"%(kde_good.bw, kde_bad.bw))
+					self.logger.warning("l(x) = %s"%(l[i]))
+					self.logger.warning("g(x) = %s"%(g[i]))
+
+				# right now, this happens because a KDE does not contain all values for a categorical parameter
+				# this cannot be fixed with the statsmodels KDE, so for now, we are just going to evaluate the first one
+				# if the good_kde has a finite value, i.e. there is no config with that value in the bad kde, so it shouldn't be terrible.
+				pick = not_finite[np.isfinite(l[not_finite])]
+				finite = np.isfinite(vals)
+				if len(pick) > 0:
+					best = vals[pick[0]]
+					best_vector = vectors[pick[0]]
+				elif np.any(finite):
+					i = np.flatnonzero(finite)[np.argmin(vals[finite])]
+					best = vals[i]
+					best_vector = vectors[i]
 
 				if best_vector is None:
 					self.logger.debug("Sampling based optimization with %i samples failed -> using random configuration"%self.num_samples)
-					sample = self.configspace.sample_configuration()
+					sample = self.configspace.sample_configuration().get_dictionary()
 					info_dict['model_based_pick']  = False
 				else:
 					self.logger.debug('best_vector: {}, {}'.format(best_vector, best))
-					sample = ConfigSpace.Configuration(self.configspace, vector=best_vector)
-					
 					try:
-						sample = ConfigSpace.util.deactivate_inactive_hyperparameters(
-									configuration_space=self.configspace,
-									configuration=sample.get_dictionary()
-									)
+						sample = self.encoder.decode(best_vector)
+						if self.encoder.is_forbidden(sample):
+							raise ValueError('Forbidden configuration')
 						info_dict['model_based_pick'] = True
 
 					except Exception as e:
 						self.logger.warning(("="*50 + "\n")*3 +\
-								"Error converting configuration:\n%s"%sample+\
+								"Error converting vector:\n%s"%best_vector+\
 								"\n here is a traceback:" +\
 								traceback.format_exc())
 						raise(e)
 
 			except:
 				self.logger.warning("Sampling based optimization with %i samples failed\n %s \nUsing random configuration"%(self.num_samples, traceback.format_exc()))
-				sample = self.configspace.sample_configuration()
+				sample = self.configspace.sample_configuration().get_dictionary()
 				info_dict['model_based_pick']  = False
 
-		return sample.get_dictionary(), info_dict
+		return sample, info_dict
 
+	def sample_from_kde(self, kde, num_samples):
+		"""
+			Draws candidates around the data points of a KDE
 
-	def impute_conditional_data(self, array):
+			All candidates are drawn at once: every candidate perturbs a
+			randomly chosen data point, continuous dimensions with a
+			truncated normal of width bandwidth_factor*bandwidth, categorical
+			dimensions by keeping the value with probability 1-bandwidth and
+			drawing a uniformly random one otherwise.
+
+			Parameters:
+			-----------
+			kde: statsmodels.nonparametric.KDEMultivariate
+				the (good) density to sample from
+			num_samples: int
+				number of candidates
+
+			returns: numpy.ndarray
+				the candidates, shape (num_samples, num_dims)
+		"""
+		idx = np.random.randint(0, len(kde.data), size=num_samples)
+		vectors = np.array(kde.data[idx], dtype=float)
+		bw = np.maximum(kde.bw, self.min_bandwidth)
+
+		continuous = self.vartypes == 0
+		if np.any(continuous):
+			m = vectors[:, continuous]
+			cbw = self.bw_factor*bw[continuous]
+			vectors[:, continuous] = sps.truncnorm.rvs(-m/cbw, (1-m)/cbw, loc=m, scale=cbw)
+
+		for i in np.flatnonzero(~continuous):
+			resample = np.random.rand(num_samples) >= (1-bw[i])
+			vectors[resample, i] = np.random.randint(self.vartypes[i], size=np.sum(resample))
 
-		return_array = np.empty_like(array)
+		return vectors
+
+
+	def impute_conditional_data(self, array):
+		"""
+			fills the NaN values of inactive hyperparameters
 
-		for i in range(array.shape[0]):
-			datum = np.copy(array[i])
-			nan_indices = np.argwhere(np.isnan(datum)).flatten()
+			The NaN values of a row are processed in the order of the
+			columns: the first remaining NaN is filled together with all
+			others from a random row that has this column active, so
+			conditional hyperparameters are filled with consistent values.
+			If no row has the column active, a valid random value is used.
+			Processing all rows column by column does this in bulk.
 
-			while (np.any(nan_indices)):
-				nan_idx = nan_indices[0]
-				valid_indices = np.argwhere(np.isfinite(array[:,nan_idx])).flatten()
+			Parameters:
+			-----------
+			array: numpy.ndarray
+				the vectors of the configurations, NaN for inactive hyperparameters
 
-				if len(valid_indices) > 0:
-					# pick one of them at random and overwrite all NaN values
-					row_idx = np.random.choice(valid_indices)
-					datum[nan_indices] = array[row_idx, nan_indices]
+			returns: numpy.ndarray
+				a copy of array without NaN values
+		"""
+		return_array = np.copy(array)
+		is_nan = np.isnan(array)
+		# the rows that can donate values for each column
+		donor_pools = [np.flatnonzero(~is_nan[:, j]) for j in range(array.shape[1])]
+
+		for j, donor_pool in enumerate(donor_pools):
+			rows = np.flatnonzero(np.isnan(return_array[:, j]))
+			if len(rows) == 0:
+				continue
+
+			if len(donor_pool) > 0:
+				# pick one of them at random for each row and overwrite all its NaN values
+				donors = donor_pool[np.random.randint(len(donor_pool), size=len(rows))]
+				block = return_array[rows]
+				block_is_nan = np.isnan(block)
+				block[block_is_nan] = array[donors][block_is_nan]
+				return_array[rows] = block
 
+			else:
+				# no good point in the data has this value activated, so fill it with a valid but random value
+				t = self.vartypes[j]
+				if t == 0:
+					return_array[rows, j] = np.random.rand(len(rows))
 				else:
-					# no good point in the data has this value activated, so fill it with a valid but random value
-					t = self.vartypes[nan_idx]
-					if t == 0:
-						datum[nan_idx] = np.random.rand()
-					else:
-						datum[nan_idx] = np.random.randint(t)
-
-				nan_indices = np.argwhere(np.isnan(datum)).flatten()
-				return_array[i,:] = datum
+					return_array[rows, j] = np.random.randint(t, size=len(rows))
+
 		return(return_array)
 
 	def new_result(self, job):
@@ -259,6 +349,10 @@ class BOHB(base_config_generator):
 		if budget not in self.configs.keys():
 			self.configs[budget] = []
 			self.losses[budget] = []
+			self.loss_order[budget] = []
+			self.kde_members[budget] = {'good': None, 'bad': None}
+			self.results_since_refit[budget] = 0
+			self.last_refit_time[budget] = -np.inf
 
 
 		# skip model building if we already have a bigger model
@@ -266,49 +360,67 @@ class BOHB(base_config_generator):
 			return
 
 		# We want to get a numerical representation of the configuration in the original space
-
-		conf = ConfigSpace.Configuration(self.configspace, job.kwargs["config"])
-		self.configs[budget].append(conf.get_array())
+		self.configs[budget].append(self.encoder.encode(job.kwargs["config"]))
 		self.losses[budget].append(loss)
+		# ties are ordered by arrival, NaN losses count as crashed runs
+		bisect.insort(self.loss_order[budget], (np.inf if np.isnan(loss) else loss, len(self.losses[budget]) - 1))
+		self.results_since_refit[budget] += 1
 
 		if len(self.configs[budget]) <= self.min_points_in_model+1:
 			self.logger.debug("Only %i run(s) for budget %f available, need more than %s -> can't build model!"%(len(self.configs[budget]), budget, self.min_points_in_model+1))
 			return
 
+		if not self.refit_due(budget):
+			return
+
+		n_configs = len(self.configs[budget])
+		n_good= max(self.min_points_in_model, (self.top_n_percent * n_configs)//100 )
+		n_bad = max(self.min_points_in_model, ((100-self.top_n_percent)*n_configs)//100)
 
-		train_configs = np.array(self.configs[budget])
-		train_losses =  np.array(self.losses[budget])
+		order = [idx for _, idx in self.loss_order[budget]]
+		members = {
+				'good': order[:n_good],
+				'bad' : order[-n_bad:]
+		}
 
-		n_good= max(self.min_points_in_model, (self.top_n_percent * train_configs.shape[0])//100 )
-		n_bad = max(self.min_points_in_model, ((100-self.top_n_percent)*train_configs.shape[0])//100)
+		n_dims = len(self.vartypes)
+		if min(len(idx) for idx in members.values()) <= n_dims:
+			return
 
-		# Refit KDE for the current budget
-		idx = np.argsort(train_losses)
+		self.results_since_refit[budget] = 0
+		self.last_refit_time[budget] = time.time()
 
-		train_data_good = self.impute_conditional_data(train_configs[idx[:n_good]])
-		train_data_bad  = self.impute_conditional_data(train_configs[idx[-n_bad:]])
+		# statsmodels (and pandas with it) is only loaded once the first model is built
+		from statsmodels.nonparametric.kernel_density import KDEMultivariate
 
-		if train_data_good.shape[0] <= train_data_good.shape[1]:
-			return
-		if train_data_bad.shape[0] <= train_data_bad.shape[1]:
-			return
-		
 		#more expensive crossvalidation method
 		#bw_estimation = 'cv_ls'
 
 		# quick rule of thumb
 		bw_estimation = 'normal_reference'
 
-		bad_kde = sm.nonparametric.KDEMultivariate(data=train_data_bad,  var_type=self.kde_vartypes, bw=bw_estimation)
-		good_kde = sm.nonparametric.KDEMultivariate(data=train_data_good, var_type=self.kde_vartypes, bw=bw_estimation)
+		kdes = dict(self.kde_models.get(budget, {}))
+		for split, idx in members.items():
+			# the imputation and bandwidths only change with the members of a split
+			if split in kdes and set(idx) == self.kde_members[budget][split]:
+				continue
+			train_data = self.impute_conditional_data(np.array([self.configs[budget][i] for i in idx]))
+			kde = KDEMultivariate(data=train_data, var_type=self.kde_vartypes, bw=bw_estimation)
+			kde.bw = np.clip(kde.bw, self.min_bandwidth, None)
+			kdes[split] = kde
+			self.kde_members[budget][split] = set(idx)
 
-		bad_kde.bw = np.clip(bad_kde.bw, self.min_bandwidth,None)
-		good_kde.bw = np.clip(good_kde.bw, self.min_bandwidth,None)
-
-		self.kde_models[budget] = {
-				'good': good_kde,
-				'bad' : bad_kde
-		}
+		self.kde_models[budget] = kdes
 
 		# update probs for the categorical parameters for later sampling
-		self.logger.debug('done building a new model for budget %f based on %i/%i split\nBest loss for this budget:%f\n\n\n\n\n'%(budget, n_good, n_bad, np.min(train_losses)))
+		self.logger.debug('done building a new model for budget %f based on %i/%i split\nBest loss for this budget:%f\n\n\n\n\n'%(budget, n_good, n_bad, self.loss_order[budget][0][0]))
+
+	def refit_due(self, budget):
+		"""
+			Whether the debouncing allows to refit the models of a budget
+		"""
+		if self.results_since_refit[budget] >= self.refit_every_n_results:
+			return True
+		if self.refit_every_n_seconds is not None:
+			return time.time() - self.last_refit_time[budget] >= self.refit_every_n_seconds
+		return False
@@ -0,0 +1,175 @@
+import numpy as np
+
+import ConfigSpace
+from ConfigSpace import c_util
+from ConfigSpace.conditions import AbstractConjunction, AndConjunction, \
+	OrConjunction, EqualsCondition, NotEqualsCondition, InCondition, LessThanCondition, \
+	GreaterThanCondition
+
+
+class ConfigurationEncoder(object):
+	"""
+		Converts between dictionaries and vectors of a fixed configuration space
+
+		Everything that ConfigSpace recomputes for every Configuration object
+		is done once: the hyperparameters in vector order, the lookup tables
+		of the categorical values and the conditions of every hyperparameter
+		on the vector values of its parents. Converting a configuration then
+		only transforms the values and evaluates the conditions column by
+		column, for a single configuration or a whole batch at once.
+	"""
+
+	def __init__(self, configspace, constants=None):
+		"""
+			Parameters:
+			-----------
+			configspace: ConfigSpace.ConfigurationSpace
+				the space of all configurations to convert
+			constants: dict
+				values of hyperparameters that are added to every
+				dictionary before it is encoded
+		"""
+		self.configspace = configspace
+		self.constants = dict(constants) if constants is not None else {}
+		self.hyperparameters = configspace.get_hyperparameters()
+		self.names = [hp.name for hp in self.hyperparameters]
+		self.forbidden_clauses = configspace.forbidden_clauses
+
+		# converters of the values of each hyperparameter to vector values
+		# and back, categorical values are looked up in a table
+		self._to_vector = []
+		self._from_vector = []
+		for hp in self.hyperparameters:
+			if hasattr(hp, 'choices'):
+				indices = {c: float(j) for j, c in enumerate(hp.choices)}
+				self._to_vector.append(indices.__getitem__)
+				self._from_vector.append(lambda v, choices=hp.choices: choices[int(round(v))])
+			elif isinstance(hp, ConfigSpace.Constant):
+				self._to_vector.append(lambda value: 0.)
+				self._from_vector.append(lambda v, value=hp.value: value)
+			else:
+				self._to_vector.append(hp._inverse_transform)
+				self._from_vector.append(hp._transform)
+
+		# the hyperparameters are in topological order, so the activity of
+		# all parents is known when the conditions of a child are evaluated
+		self._conditions = []
+		for i, name in enumerate(self.names):
+			conditions = configspace.get_parent_conditions_of(name)
+			if len(conditions) > 0:
+				parents = sorted(set(p for c in conditions for p in self._get_parents(c)))
+				self._conditions.append((i, conditions, parents))
+
+	def encode(self, configs):
+		"""
+			Parameters:
+			-----------
+			configs: dict or list of dicts
+				values of the hyperparameters, values of inactive
+				hyperparameters are ignored
+
+			returns: numpy.ndarray
+				the vector of each configuration with NaN for inactive
+				hyperparameters, shape (num_dims,) for a single dictionary and
+				(num_configs, num_dims) otherwise
+		"""
+		single = isinstance(configs, dict)
+		if single:
+			configs = [configs]
+
+		vectors = np.empty((len(configs), len(self.names)))
+		for r, config in enumerate(configs):
+			config = dict(self.constants, **config)
+			vectors[r] = [
+				np.nan if config.get(name) is None else to_vector(config[name])
+				for name, to_vector in zip(self.names, self._to_vector)
+			]
+
+		if single:
+			return(self._deactivate(vectors[0]))
+		vectors[~self._get_active(vectors)] = np.nan
+		return(vectors)
+
+	def decode(self, vectors):
+		"""
+			Parameters:
+			-----------
+			vectors: numpy.ndarray
+				vector of one configuration, or one per row; values of
+				inactive hyperparameters are ignored
+
+			returns: dict or list of dicts
+				the values of the active hyperparameters of each configuration
+		"""
+		vectors = np.asarray(vectors, dtype=float)
+		if vectors.ndim == 1:
+			return(self._to_dict(self._deactivate(vectors)))
+		vectors = np.where(self._get_active(vectors), vectors, np.nan)
+		return([self._to_dict(v) for v in vectors])
+
+	def is_forbidden(self, config):
+		"""
+			whether a configuration (dict) violates a forbidden clause
+		"""
+		if len(self.forbidden_clauses) == 0:
+			return(False)
+		try:
+			c_util.check_forbidden(self.forbidden_clauses, self.encode(config))
+		except ConfigSpace.exceptions.ForbiddenValueError:
+			return(True)
+		return(False)
+
+	def _to_dict(self, vector):
+		return({
+			name: from_vector(v)
+			for name, from_vector, v in zip(self.names, self._from_vector, vector)
+			if v == v
+		})
+
+	def _get_parents(self, condition):
+		# the parents that need to be active for the condition to hold
+		if isinstance(condition, OrConjunction):
+			return([])
+		if isinstance(condition, AbstractConjunction):
+			return([p for c in condition.components for p in self._get_parents(c)])
+		return([condition.parent_vector_id])
+
+	def _deactivate(self, vector):
+		# a single vector is cheaper to check with the conditions'
+		# own evaluation than with numpy
+		vector = np.array(vector, dtype=float)
+		for i, conditions, parents in self._conditions:
+			if not (all(vector[p] == vector[p] for p in parents) and \
+					all(c.evaluate_vector(vector) for c in conditions)):
+				vector[i] = np.nan
+		return(vector)
+
+	def _get_active(self, vectors):
+		active = np.ones(vectors.shape, dtype=bool)
+		for i, conditions, parents in self._conditions:
+			for condition in conditions:
+				active[:, i] &= self._evaluate(condition, vectors, active)
+		return(active)
+
+	def _evaluate(self, condition, vectors, active):
+		if isinstance(condition, AbstractConjunction):
+			results = [self._evaluate(c, vectors, active) for c in condition.components]
+			if isinstance(condition, AndConjunction):
+				return(np.all(results, axis=0))
+			return(np.any(results, axis=0))
+
+		parent = condition.parent_vector_id
+		values = vectors[:, parent]
+		if isinstance(condition, EqualsCondition):
+			result = values == condition.vector_value
+		elif isinstance(condition, NotEqualsCondition):
+			result = values != condition.vector_value
+		elif isinstance(condition, InCondition):
+			result = np.isin(values, condition.vector_values)
+		elif isinstance(condition, LessThanCondition):
+			result = values < condition.vector_value
+		elif isinstance(condition, GreaterThanCondition):
+			result = values > condition.vector_value
+		else:
+			raise ValueError('Unsupported condition %s'%condition)
+		return(active[:, parent] & result)
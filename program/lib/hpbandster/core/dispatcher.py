@@ -5,6 +5,8 @@ import time
 
 import Pyro4
 
+from hpbandster.core.utils import locate_nameserver
+
 
 class Job(object):
 	def __init__(self, id, *args, **kwargs):
@@ -52,16 +54,45 @@ class Worker(object):
 
 	def is_busy(self):
 		return(self.proxy.is_busy())
+
+	def start_computation(self, callback, id, *args, **kwargs):
+		self.proxy.start_computation(callback, id, *args, **kwargs)
+
+	def release(self):
+		self.proxy._pyroRelease()
 		
 	def __repr__(self):
 		return(self.name)
 
 
+class LocalWorker(Worker):
+	"""
+		dispatcher side handle of a worker running in the same process
+
+		The jobs are handed to the worker thread through its queue, the
+		worker calls the dispatcher's register_result directly.
+	"""
+	def __init__(self, name, worker):
+		self.name = name
+		self.proxy = worker
+		self.runs_job = None
+
+	def is_alive(self):
+		return(self.proxy.local_running)
+
+	def start_computation(self, callback, id, *args, **kwargs):
+		self.proxy.local_jobs.put((callback, id, args, kwargs))
+
+	def release(self):
+		pass
+
+
 class Dispatcher(object):
 	def __init__(self, new_result_callback, run_id='0',
 					ping_interval=10, nameserver='localhost',
 					nameserver_port=None, 
-					host=None, logger=None, queue_callback=None):
+					host=None, logger=None, queue_callback=None,
+					transport='pyro'):
 
 		self.new_result_callback = new_result_callback
 		self.queue_callback = queue_callback
@@ -71,6 +102,9 @@ class Dispatcher(object):
 		self.host = host
 		self.ping_interval = int(ping_interval)
 		self.shutdown_all_threads = False
+		# 'pyro' or 'local', the latter only finds workers in this process
+		self.transport = transport
+		self.local_shutdown = threading.Event()
 
 
 		if logger is None:
@@ -101,17 +135,23 @@ class Dispatcher(object):
 			t2.start()
 			self.logger.info('DISPATCHER: started the \'job_runner\' thread')
 	
+			if self.transport == 'local':
+				with self._locate_nameserver() as ns:
+					ns.register(self.pyro_id, self)
+				self.logger.info("DISPATCHER: using the local transport")
+			else:
+				self.pyro_daemon = Pyro4.core.Daemon(host=self.host)
 
-			self.pyro_daemon = Pyro4.core.Daemon(host=self.host)
+				with self._locate_nameserver() as ns:
+					uri = self.pyro_daemon.register(self, self.pyro_id)
+					ns.register(self.pyro_id, uri)
 
-			with Pyro4.locateNS(host=self.nameserver, port=self.nameserver_port) as ns:
-				uri = self.pyro_daemon.register(self, self.pyro_id)
-				ns.register(self.pyro_id, uri)
+				self.logger.info("DISPATCHER: Pyro daemon running on %s"%(self.pyro_daemon.locationStr))
 
-			self.logger.info("DISPATCHER: Pyro daemon running on %s"%(self.pyro_daemon.locationStr))
-
-		
-		self.pyro_daemon.requestLoop()
+		if self.transport == 'local':
+			self.local_shutdown.wait()
+		else:
+			self.pyro_daemon.requestLoop()
 
 
 		with self.discover_cond:
@@ -123,7 +163,7 @@ class Dispatcher(object):
 			
 			
 		
-			with Pyro4.locateNS(self.nameserver, port=self.nameserver_port) as ns:
+			with self._locate_nameserver() as ns:
 				ns.remove(self.pyro_id)
 
 		t1.join()
@@ -145,7 +185,13 @@ class Dispatcher(object):
 			self.shutdown_all_workers()
 
 		with self.runner_cond:
-			self.pyro_daemon.shutdown()
+			if self.transport == 'local':
+				self.local_shutdown.set()
+			else:
+				self.pyro_daemon.shutdown()
+
+	def _locate_nameserver(self):
+		return(locate_nameserver(self.transport, host=self.nameserver, port=self.nameserver_port))
 	
 	@Pyro4.expose
 	@Pyro4.oneway
@@ -164,13 +210,17 @@ class Dispatcher(object):
 			self.logger.debug('DISPATCHER: Starting worker discovery')
 			update = False
 		
-			with Pyro4.locateNS(host=self.nameserver, port=self.nameserver_port) as ns:
+			with self._locate_nameserver() as ns:
 				worker_names = ns.list(prefix="hpbandster.run_%s.worker."%self.run_id)
 				self.logger.debug("DISPATCHER: Found %i potential workers, %i currently in the pool."%(len(worker_names), len(self.worker_pool)))
 				
 				for wn, uri in worker_names.items():
 					if not wn in self.worker_pool:
-						w = Worker(wn, uri)
+						# the local nameserver holds the workers themselves instead of URIs
+						if self.transport == 'local':
+							w = LocalWorker(wn, uri)
+						else:
+							w = Worker(wn, uri)
 						if not w.is_alive():
 							self.logger.debug('DISPATCHER: skipping dead worker, %s'%wn)
 							continue 
@@ -259,7 +309,7 @@ class Dispatcher(object):
 			job.time_it('started')
 			worker.runs_job = job.id
 		
-			worker.proxy.start_computation(self, job.id, *job.args, **job.kwargs)
+			worker.start_computation(self, job.id, *job.args, **job.kwargs)
 
 			job.worker_name = wn
 			self.running_jobs[job.id] = job
@@ -298,7 +348,7 @@ class Dispatcher(object):
 			# label worker as idle again
 			try:
 				self.worker_pool[job.worker_name].runs_job = None
-				self.worker_pool[job.worker_name].proxy._pyroRelease()
+				self.worker_pool[job.worker_name].release()
 				self.idle_workers.add(job.worker_name)
 				# notify the job_runner to check for more jobs to run
 				self.runner_cond.notify()
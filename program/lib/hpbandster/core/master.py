@@ -26,6 +26,7 @@ class Master(object):
 					dynamic_queue_size=True,
 					logger=None,
 					result_logger=None,
+					transport='pyro',
 					):
 		"""
 
@@ -69,6 +70,10 @@ class Master(object):
 			the logger to output some (more or less meaningful) information
 		result_logger: hpbandster.api.results.util.json_result_logger object
 			a result logger that writes live results to disk
+		transport: str
+			'pyro' (default) to find the workers through the Pyro4 nameserver, or 'local' if all
+			workers run in this process (started with transport='local' as well). The latter
+			needs no nameserver and avoids all sockets and serialization.
 		"""
 
 		self.working_directory = working_directory
@@ -106,7 +111,7 @@ class Master(object):
 						'time_ref'   : self.time_ref
 					}
 
-		self.dispatcher = Dispatcher( self.job_callback, queue_callback=self.adjust_queue_size, run_id=run_id, ping_interval=ping_interval, nameserver=nameserver, nameserver_port=nameserver_port, host=host)
+		self.dispatcher = Dispatcher( self.job_callback, queue_callback=self.adjust_queue_size, run_id=run_id, ping_interval=ping_interval, nameserver=nameserver, nameserver_port=nameserver_port, host=host, transport=transport)
 
 		self.dispatcher_thread = threading.Thread(target=self.dispatcher.run)
 		self.dispatcher_thread.start()
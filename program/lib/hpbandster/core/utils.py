@@ -46,3 +46,51 @@ def start_local_nameserver(host=None, port=0, nic_name=None):
 	
 	thread.start()
 	return(host, int(port))
+
+
+
+class LocalNameserver(object):
+	"""
+		in-process replacement of the Pyro4 nameserver
+
+		Used by the 'local' transport of the dispatcher and the workers: instead of
+		URIs, the objects themselves are registered, so that the dispatcher and
+		workers living in the same process talk to each other directly, without
+		sockets or serialization.
+	"""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.objects = {}
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self, *args):
+		pass
+
+	def register(self, name, obj):
+		with self.lock:
+			self.objects[name] = obj
+
+	def remove(self, name):
+		with self.lock:
+			self.objects.pop(name, None)
+
+	def list(self, prefix=''):
+		with self.lock:
+			return({name: obj for name, obj in self.objects.items() if name.startswith(prefix)})
+
+
+local_nameserver = LocalNameserver()
+
+
+def locate_nameserver(transport, host=None, port=None):
+	"""
+		returns the nameserver for the given transport ('pyro' or 'local'),
+		to be used as a context manager like Pyro4.locateNS
+	"""
+	if transport == 'local':
+		return(local_nameserver)
+	if transport == 'pyro':
+		return(Pyro4.locateNS(host=host, port=port))
+	raise ValueError("Unknown transport '%s', use 'pyro' or 'local'"%transport)
@@ -4,18 +4,25 @@ import pickle
 import os, socket
 
 
+import queue
 import traceback
 import threading
 import Pyro4
 
+from hpbandster.core.utils import locate_nameserver
+
 
 
 class Worker(object):
-	def __init__(self, run_id, nameserver=None, nameserver_port=None, logger=None, host=None, id=None):
+	def __init__(self, run_id, nameserver=None, nameserver_port=None, logger=None, host=None, id=None, transport='pyro'):
 		self.run_id = run_id
 		self.host = host
 		self.nameserver = nameserver
 		self.nameserver_port = nameserver_port
+		# 'pyro' or 'local', with the latter the dispatcher has to run in the same process
+		self.transport = transport
+		self.local_jobs = queue.Queue()
+		self.local_running = False
 		self.worker_id =  "hpbandster.run_%s.worker.%s.%i"%(self.run_id, socket.gethostname(), os.getpid())
 		
 		if not id is None:
@@ -86,6 +93,10 @@ class Worker(object):
 			self._run()
 
 	def _run(self):
+		if self.transport == 'local':
+			self._run_local()
+			return
+
 		# initial ping to the dispatcher to register the worker
 		with Pyro4.locateNS(host=self.nameserver, port=self.nameserver_port) as ns:
 			self.logger.debug('WORKER: Connected to nameserver %s'%(str(ns)))
@@ -118,8 +129,34 @@ class Worker(object):
 
 		with Pyro4.locateNS(self.nameserver, port=self.nameserver_port) as ns:
 			ns.remove(self.worker_id)
-		
-		
+
+	def _run_local(self):
+		"""
+			runs the jobs the dispatcher of this process puts into self.local_jobs
+		"""
+		self.local_running = True
+		with locate_nameserver(self.transport) as ns:
+			ns.register(self.worker_id, self)
+			dispatchers = ns.list(prefix="hpbandster.run_%s.dispatcher"%self.run_id)
+
+		# no need to wait for the next ping
+		for dn, dispatcher in dispatchers.items():
+			self.logger.debug('WORKER: found dispatcher %s'%dn)
+			dispatcher.trigger_discover_worker()
+
+		self.logger.info('WORKER: start listening for jobs')
+
+		while True:
+			job = self.local_jobs.get()
+			if job is None:
+				break
+			callback, id, args, kwargs = job
+			self.start_computation(callback, id, *args, **kwargs)
+
+		self.local_running = False
+		with locate_nameserver(self.transport) as ns:
+			ns.remove(self.worker_id)
+
 
 	def compute(self, *args, **kwargs):
 		raise NotImplementedError("Subclass hpbandster.distributed.worker and overwrite the compute method in your worker script")
@@ -157,6 +194,10 @@ class Worker(object):
 	@Pyro4.expose
 	@Pyro4.oneway
 	def shutdown(self):
+		if self.transport == 'local':
+			# like the oneway Pyro call, do not wait for a running job
+			self.local_jobs.put(None)
+			return
 		self.pyro_daemon.shutdown()
 		if not self.thread is None:
 			self.thread.join()
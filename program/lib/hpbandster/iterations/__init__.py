@@ -1 +1,2 @@
 from hpbandster.iterations.successivehalving import SuccessiveHalving
+from hpbandster.iterations.asynchronoussuccessivehalving import AsynchronousSuccessiveHalving
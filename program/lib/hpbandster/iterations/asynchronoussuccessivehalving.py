@@ -0,0 +1,103 @@
+from hpbandster.iterations.base import BaseIteration
+
+import numpy as np
+
+
+class AsynchronousSuccessiveHalving(BaseIteration):
+	"""
+		SuccessiveHalving without a barrier between the stages (ASHA, see
+		Li et al. (2018) for reference).
+
+		A configuration advances to the next budget as soon as it ranks in
+		the top 1/eta of all results seen so far on its budget. If no
+		configuration can advance, a new one is sampled for the first stage,
+		so a free worker never waits for the slowest run of a stage. As in
+		SuccessiveHalving, at most num_configs[i] configurations are run
+		on budgets[i].
+	"""
+
+	def __init__(self, *args, eta=3, **kwargs):
+		"""
+			Parameters:
+			-----------
+				eta: float
+					a configuration advances if it ranks in the top 1/eta
+					of the results on its budget
+		"""
+		super().__init__(*args, **kwargs)
+		self.eta = eta
+
+	def get_next_run(self):
+		"""
+			function to return the next configuration and budget to run.
+
+			This function is called from HB_master, don't call this from
+			your script.
+
+			Advancing a configuration is preferred over sampling a new one,
+			larger budgets first. It returns None if all configurations of
+			the first stage have been sampled and nothing can advance until
+			another run finishes.
+		"""
+
+		if self.is_finished:
+			return(None)
+
+		for k,v in self.data.items():
+			if v.status == 'QUEUED':
+				v.status = 'RUNNING'
+				self.num_running += 1
+				return(k, v.config, v.budget)
+
+		# without pending runs and new configurations, no more results can
+		# arrive and the stages are ranked like in SuccessiveHalving
+		final = self.num_running == 0 and self.actual_num_configs[0] == self.num_configs[0]
+
+		for stage in reversed(range(len(self.num_configs) - 1)):
+			config_id = self._get_config_to_advance(stage, final)
+			if not config_id is None:
+				self.logger.debug('ITERATION: Advancing config %s to next budget %f'%(config_id, self.budgets[stage+1]))
+				self.data[config_id].status = 'QUEUED'
+				self.data[config_id].budget = self.budgets[stage+1]
+				self.actual_num_configs[stage+1] += 1
+				return(self.get_next_run())
+
+		if self.actual_num_configs[0] < self.num_configs[0]:
+			self.add_configuration()
+			return(self.get_next_run())
+
+		if final:
+			self.finish_up()
+
+		return(None)
+
+	def _get_config_to_advance(self, stage, final):
+		"""
+			Returns the best configuration that finished on the budget of
+			the given stage, ranks in its top 1/eta and has not advanced yet,
+			or None.
+
+			Crashed runs count as results with an infinite loss.
+		"""
+		if self.actual_num_configs[stage+1] >= self.num_configs[stage+1]:
+			return(None)
+
+		budget = self.budgets[stage]
+		config_ids = [cid for cid, d in self.data.items() if budget in d.results]
+		if final:
+			num_advance = self.num_configs[stage+1]
+		else:
+			num_advance = int(len(config_ids) / self.eta)
+
+		losses = np.array([self._get_loss(self.data[cid], budget) for cid in config_ids])
+		for i in np.argsort(losses, kind='mergesort')[:num_advance]:
+			d = self.data[config_ids[i]]
+			if d.status == 'REVIEW' and d.budget == budget:
+				return(config_ids[i])
+		return(None)
+
+	def _get_loss(self, datum, budget):
+		result = datum.results[budget]
+		if result is None or not np.isfinite(result['loss']):
+			return(np.inf)
+		return(result['loss'])
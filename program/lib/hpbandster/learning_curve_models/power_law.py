@@ -0,0 +1,79 @@
+import numpy as np
+
+from hpbandster.learning_curve_models.base import LCModel
+
+
+class PowerLaw(LCModel):
+    """
+        Extrapolates a single partially observed curve with
+
+            loss(t) = a + b * t^(-c)
+
+        The model is fitted on the observed part of the curve only and needs
+        no other curves, which makes it cheap enough to be evaluated after
+        every step of an iterative fit.
+    """
+
+    def __init__(self, exponents=None):
+        """
+            Parameters:
+            -----------
+
+            exponents: numpy array or None
+                candidate values for c, a and b are fitted by least squares
+                for every candidate and the best fit is kept
+        """
+        if exponents is None:
+            exponents = np.logspace(-2, 1, 61)
+        self.exponents = np.asarray(exponents, dtype=np.float64)
+
+    def fit(self, times, losses, configs=None):
+        """
+            nothing is learned across curves
+        """
+        return self
+
+    def extend_partial(self, times, obs_times, obs_losses, config=None):
+        """
+            extends a partially observed curve
+
+            Parameters:
+            -----------
+
+            times: numpy array
+                times where to predict the loss
+            obs_times: numpy array
+                times where the curve has already been observed, at least
+                two of them must differ
+            obs_losses: numpy array
+                corresponding observed losses
+            config: numpy array
+                ignored
+
+            Returns:
+            --------
+
+            mean and variance prediction at input times. The variance is the
+            residual variance of the fit plus the squared half of the change
+            predicted after the last observation, the further the curve is
+            extrapolated the less certain the prediction.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        obs_times = np.asarray(obs_times, dtype=np.float64)
+        obs_losses = np.asarray(obs_losses, dtype=np.float64)
+
+        # one row per candidate exponent
+        T = obs_times[np.newaxis, :] ** -self.exponents[:, np.newaxis]
+        T_centered = T - T.mean(axis=1, keepdims=True)
+        losses_centered = obs_losses - obs_losses.mean()
+        b = (T_centered * losses_centered).sum(axis=1) / \
+            (T_centered ** 2).sum(axis=1)
+        a = obs_losses.mean() - b * T.mean(axis=1)
+        sse = ((obs_losses - a[:, np.newaxis] - b[:, np.newaxis] * T) ** 2)\
+            .sum(axis=1)
+
+        best = np.argmin(sse)
+        mean = a[best] + b[best] * times ** -self.exponents[best]
+        residual_variance = sse[best] / max(len(obs_losses) - 3, 1)
+        variance = residual_variance + ((mean - obs_losses[-1]) / 2) ** 2
+        return mean, variance
@@ -1,25 +1,113 @@
+import multiprocessing.pool
 import os
 import time
-import unittest.mock
+import warnings
 
 import hp_util
 import portfolio as portfolio_module
-from hpbandster.core.utils import start_local_nameserver
 from autosklearn.ensemble_builder import EnsembleBuilder
 import autosklearn.util.backend
 from autosklearn.data import competition_data_manager
+from autosklearn.evaluation.worker_pool import EvaluationWorkerPool
 from autosklearn.metrics import roc_auc, mean_squared_error
 from autosklearn.constants import BINARY_CLASSIFICATION, STRING_TO_TASK_TYPES
 import numpy as np
+import psutil
 import pynisher
-import sklearn.decomposition
-import sklearn.feature_selection
-import sklearn.pipeline
-import sklearn.preprocessing
+import scipy.sparse
+
+
+# Memory for the blocks of columns that are scored at the same time
+FEATURE_SELECTION_BUFFER_MB = 256
+
+
+def _score_columns(X, rows, class_starts, class_counts, columns):
+    """Median and ANOVA F-score (like ``sklearn.feature_selection.f_classif``
+    after median imputation) of a block of columns.
+
+    ``rows`` are the rows to use, sorted by class, ``class_starts`` and
+    ``class_counts`` give the position and size of each class in them."""
+    block = X[rows, columns]
+    if scipy.sparse.issparse(block):
+        block = block.toarray()
+    block = np.asarray(block, dtype=np.float64)
+
+    with warnings.catch_warnings():
+        # Columns without any value are imputed with 0 and get a NaN score
+        warnings.simplefilter('ignore', RuntimeWarning)
+        medians = np.nanmedian(block, axis=0)
+    medians[np.isnan(medians)] = 0
+    missing_rows, missing_columns = np.nonzero(np.isnan(block))
+    block[missing_rows, missing_columns] = medians[missing_columns]
+
+    n_samples = len(rows)
+    n_classes = len(class_counts)
+    class_sums = np.add.reduceat(block, class_starts, axis=0)
+    square_of_sums = class_sums.sum(axis=0) ** 2 / n_samples
+    sstot = np.einsum('ij,ij->j', block, block) - square_of_sums
+    ssbn = (class_sums ** 2 / class_counts[:, None]).sum(axis=0) \
+        - square_of_sums
+    sswn = sstot - ssbn
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = (ssbn / (n_classes - 1)) / (sswn / (n_samples - n_classes))
+    return medians, scores
+
+
+def _select_features(X, y, n_keep, rows=None, n_jobs=1):
+    """Select the ``n_keep`` columns of ``X`` with the highest ANOVA F-score
+    after median imputation, like ``SelectKBest(f_classif)`` in a pipeline
+    after ``Imputer(strategy='median')``.
+
+    The columns are scored in blocks, so that the imputed matrix never exists
+    as a whole, by ``n_jobs`` threads. Returns the mask of the selected
+    columns and the medians of all columns."""
+    if rows is None:
+        rows = np.arange(X.shape[0])
+    _, y = np.unique(np.asarray(y)[rows], return_inverse=True)
+    order = np.argsort(y, kind='mergesort')
+    rows = rows[order]
+    class_counts = np.bincount(y)
+    class_starts = np.concatenate(([0], np.cumsum(class_counts)[:-1]))
+
+    n_features = X.shape[1]
+    block_size = max(1, int(FEATURE_SELECTION_BUFFER_MB * 1024 * 1024 /
+                            (8 * len(rows) * n_jobs)))
+    blocks = [slice(start, min(start + block_size, n_features))
+              for start in range(0, n_features, block_size)]
+
+    def score(columns):
+        return _score_columns(X, rows, class_starts, class_counts, columns)
+
+    if n_jobs > 1:
+        pool = multiprocessing.pool.ThreadPool(n_jobs)
+        try:
+            results = pool.map(score, blocks)
+        finally:
+            pool.close()
+    else:
+        results = [score(columns) for columns in blocks]
+    medians = np.concatenate([result[0] for result in results])
+    scores = np.concatenate([result[1] for result in results])
+
+    # Same tie breaking and handling of NaNs as SelectKBest
+    scores[np.isnan(scores)] = np.finfo(scores.dtype).min
+    mask = np.zeros(n_features, dtype=bool)
+    mask[np.argsort(scores, kind='mergesort')[-n_keep:]] = True
+    return mask, medians
+
+
+def _project(X, mask, medians):
+    # Takes the selected columns and imputes them in one pass
+    X = X[:, mask]
+    if scipy.sparse.issparse(X):
+        X = X.toarray()
+    missing_rows, missing_columns = np.nonzero(np.isnan(X))
+    X[missing_rows, missing_columns] = medians[mask][missing_columns]
+    return X
 
 
 def project_data_via_feature_selection(X_train, X_test, y_train, logger,
-                                       subset=None):
+                                       subset=None, n_jobs=1):
     n_features = X_train.shape[1]
     n_keep = 500
     if n_features > n_keep:
@@ -28,9 +116,6 @@ def project_data_via_feature_selection(X_train, X_test, y_train, logger,
             n_features,
             n_keep
         )
-        imp = sklearn.preprocessing.Imputer(strategy='median')
-        pca = sklearn.feature_selection.SelectKBest(k=n_keep)
-        pipeline = sklearn.pipeline.Pipeline((('imp', imp), ('pca', pca)))
         if subset is not None and X_train.shape[0] > subset:
 
             logger.info(
@@ -38,30 +123,49 @@ def project_data_via_feature_selection(X_train, X_test, y_train, logger,
                 subset
             )
 
-            subset_indices = list(
-                np.random.choice(list(range(X_train.shape[0])), size=subset)
-            )
+            subset_indices = np.random.choice(X_train.shape[0], size=subset)
             subset_indices.sort()
-            X_train_ = X_train[subset_indices]
-            y_train_ = y_train[subset_indices]
         else:
-            X_train_ = X_train
-            y_train_ = y_train
+            subset_indices = None
 
-        pipeline.fit(X_train_, y_train_)
-        X_train = pipeline.transform(X_train)
-        X_test = pipeline.transform(X_test)
-        mask = pca._get_support_mask()
+        mask, medians = _select_features(X_train, y_train, n_keep,
+                                         rows=subset_indices, n_jobs=n_jobs)
+        X_train = _project(X_train, mask, medians)
+        X_test = _project(X_test, mask, medians)
         assert np.sum(mask) == n_keep
     else:
         mask = np.ones(X_train.shape[1], dtype=bool)
     return X_train, X_test, mask
 
 
+def start_workers(n_workers, seed, counters, **kwargs):
+    """Start ``n_workers`` AutoMLWorkers in background threads.
+
+    Worker ``i`` uses ``seed + i`` as its id and as the seed of its target
+    algorithm runs; its run numbers start at ``counters[i]``."""
+    workers = []
+    for i in range(n_workers):
+        worker = hp_util.AutoMLWorker(id=seed + i, counter=counters[i],
+                                      **kwargs)
+        worker.run(background=True)
+        workers.append(worker)
+    return workers
+
+
 def run_automl(args, logger, input_dir, output_dir, tmp_output_dir, dataset_name,
-               budget, seed=3, sleep=5):
+               budget, seed=3, sleep=5, n_workers=1, memory_budget=None):
     start_task = float(time.time())
 
+    # Split the memory budget evenly across the evaluation workers, a single
+    # worker always gets the full TA_MEMORY_LIMIT
+    if memory_budget is None:
+        memory_budget = max(hp_util.TA_MEMORY_LIMIT,
+                            psutil.virtual_memory().available / 1024 / 1024)
+    memory_limit = min(hp_util.TA_MEMORY_LIMIT,
+                       int(memory_budget / n_workers))
+    logger.info('Using %d worker(s) with a memory limit of %d MB each.',
+                n_workers, memory_limit)
+
     logger.info("Using %s as tmp outputdir and %s as outdir" %
                 (tmp_output_dir, output_dir))
 
@@ -69,16 +173,19 @@ def run_automl(args, logger, input_dir, output_dir, tmp_output_dir, dataset_name
     D = competition_data_manager.CompetitionDataManager(
         name=os.path.join(input_dir, dataset_name),
         args=args,
-        max_memory_in_mb=1048576)
+        max_memory_in_mb=1048576,
+        streaming=True)
     n_data_points = D.data['X_train'].shape[0]
 
     to_pynish = pynisher.enforce_limits(mem_in_mb=6000, wall_time_in_s=60)(project_data_via_feature_selection)
     rval = to_pynish(
         D.data['X_train'], D.data['X_test'], D.data['Y_train'], logger,
+        n_jobs=os.cpu_count() or 1,
     )
     print(f'___________FEAT TYPE___________: {D.feat_type}')
     print(f'___________INFO___________: {D.info}')
-    print(f'___________RVAL___________: {len(rval[2])}')
+    if rval is not None:
+        print(f'___________RVAL___________: {len(rval[2])}')
     if rval is None:
         logger.warning(
             'Error projecting data via full feature selection: %s',
@@ -121,6 +228,7 @@ def run_automl(args, logger, input_dir, output_dir, tmp_output_dir, dataset_name
     logger.info(
         'Dataset dimensions: %s %s', D.data['X_train'].shape, D.data['Y_train'].shape,
     )
+    n_features = D.data['X_train'].shape[1]
 
     print('TIME_BUDGET {} {}'.format(budget, float(D.info['time_budget'])))
     # We take the min in case there is less time left
@@ -155,7 +263,8 @@ def run_automl(args, logger, input_dir, output_dir, tmp_output_dir, dataset_name
                                        limit=time_left_for_this_task,
                                        ensemble_size=50,
                                        ensemble_nbest=50,
-                                       seed=seed,
+                                       # The workers use different seeds
+                                       seed=seed if n_workers == 1 else -1,
                                        shared_mode=False,
                                        max_iterations=None,
                                        precision="32",
@@ -189,28 +298,39 @@ def run_automl(args, logger, input_dir, output_dir, tmp_output_dir, dataset_name
 
 
     print(f'____________ TOTAL BUDGET _____________ {total_budget}')
-    ns_host, ns_port = start_local_nameserver()
+    # Fork the evaluation processes before the worker threads are started
+    worker_pool = EvaluationWorkerPool(
+        backend=backend,
+        n_workers=n_workers,
+        mem_in_mb=memory_limit,
+    )
+    # Learns the runtime of each classifier from all runs of all workers
+    runtime_model = hp_util.RuntimeModel()
     # (Note) ID serves as worker.id and seed for TargetAlgorithmEvaluator
     # If we use more than one worker this number needs to be unique
     run_id = '0'
-    worker = hp_util.AutoMLWorker(
+    workers = start_workers(
+        n_workers=n_workers,
+        seed=seed,
+        counters=[2] * n_workers,
         dataset_name=dataset_name,
         n_data_points=n_data_points,
+        n_features=n_features,
         backend=backend,
         total_budget=total_budget,
         total_time=time_left_for_this_task,
         run_id=run_id,
-        nameserver=ns_host,
-        nameserver_port=ns_port,
+        transport='local',
         mode=None, # set to 'subsets' or 'iterations' to overwrite algorithm specific treatment
-        id=seed,
         shuffle=shuffle,
+        worker_pool=worker_pool,
+        memory_limit=memory_limit,
+        runtime_model=runtime_model,
     )
-    worker.run(background=True)
 
     autosklearn_portfolio = portfolio_module.get_hydra_portfolio(dataset_name)
     for entry in autosklearn_portfolio:
-        for constant in worker.constant_values:
+        for constant in workers[0].constant_values:
             if constant in entry:
                 del entry[constant]
     logger.info(
@@ -220,28 +340,31 @@ def run_automl(args, logger, input_dir, output_dir, tmp_output_dir, dataset_name
     )
 
     SSB = hp_util.SideShowBOHB(
-        configspace=worker.get_config_space(),
+        configspace=workers[0].get_config_space(),
         initial_configs=autosklearn_portfolio,
+        runtime_predictor=workers[0].predict_runtime,
+        checkpoint_deleter=workers[0].delete_checkpoint,
         run_id=run_id,
         eta=eta, min_budget=min_budget, max_budget=max_budget,
         SH_only=True,       # suppresses Hyperband's outer loop and runs SuccessiveHalving only
-        nameserver=ns_host,
-        nameserver_port=ns_port,
+        transport='local',
         ping_interval=sleep,
         job_queue_sizes=(-1, 0),
         dynamic_queue_size=True,
     )
 
     if min_budget == max_budget:
-        res = SSB.run(len(autosklearn_portfolio), min_n_workers=1)
+        res = SSB.run(len(autosklearn_portfolio), min_n_workers=n_workers)
     else:
-        res = SSB.run(1, min_n_workers=1)
+        res = SSB.run(1, min_n_workers=n_workers)
 
     runs = res.get_all_runs()
     all_losses = np.array([r.loss for r in runs], dtype=np.float)
     times = [r.time_stamps['finished'] - r.time_stamps['started']
              for r in runs]
-    time_taken = np.nansum(times)
+    # The workers evaluate in parallel, so the wall clock time taken is
+    # roughly the sum of the run times divided by the number of workers
+    time_taken = np.nansum(times) / n_workers
     if time_taken is not None and np.isfinite(time_taken) and min_budget != max_budget:
         time_left_for_this_worker = time_left_for_this_task - time_taken
     else:
@@ -269,61 +392,69 @@ def run_automl(args, logger, input_dir, output_dir, tmp_output_dir, dataset_name
                     'preprocessor': [ 'no_preprocessing'],
                   }
 
-        bohb_worker = hp_util.AutoMLWorker(
+        bohb_workers = start_workers(
+            n_workers=n_workers,
+            seed=seed,
+            counters=[worker.counter + 1 for worker in workers],
             dataset_name=dataset_name,
             n_data_points=n_data_points,
+            n_features=n_features,
             backend=backend,
             total_budget=total_budget,
             total_time=time_left_for_this_worker,
             run_id=run_id,
             include=include,
             # gives access to the whole autosklearn configspace
-            nameserver=ns_host,
-            nameserver_port=ns_port,
+            transport='local',
             mode=None,
             # set to 'subsets' or 'iterations' to overwrite algorithm specific treatment
-            id=seed,
             shuffle=shuffle,
-            counter=worker.counter + 1,
             use_backup_budgets=True,
+            worker_pool=worker_pool,
+            memory_limit=memory_limit,
+            runtime_model=runtime_model,
         )
-        bohb_worker.run(background=True)
 
         SSB = hp_util.SideShowBOHB(
-            configspace=bohb_worker.get_config_space(),
+            configspace=bohb_workers[0].get_config_space(),
             initial_configs=portfolio_,
+            runtime_predictor=bohb_workers[0].predict_runtime,
+            checkpoint_deleter=bohb_workers[0].delete_checkpoint,
             run_id=run_id,
             eta=eta, min_budget=min_budget, max_budget=max_budget,
             SH_only=False,
             # suppresses Hyperband's outer loop and runs SuccessiveHalving only
             random_fraction=0.1,
-            nameserver=ns_host,
-            nameserver_port=ns_port,
+            transport='local',
             ping_interval=sleep,
             job_queue_sizes=(-1, 0),
             dynamic_queue_size=True,
         )
 
     else:
-        worker = hp_util.AutoMLWorker(
+        workers = start_workers(
+            n_workers=n_workers,
+            seed=seed,
+            counters=[worker.counter + 1 for worker in workers],
             dataset_name=dataset_name,
             n_data_points=n_data_points,
+            n_features=n_features,
             backend=backend,
             total_budget=total_budget,
             total_time=time_left_for_this_worker,
             run_id=run_id,
-            nameserver=ns_host,
-            nameserver_port=ns_port,
+            transport='local',
             mode=None,
             # set to 'subsets' or 'iterations' to overwrite algorithm
             # specific treatment
-            id=seed,
             shuffle=shuffle,
-            counter=worker.counter + 1,
+            worker_pool=worker_pool,
+            memory_limit=memory_limit,
+            runtime_model=runtime_model,
         )
-        worker.run(background=True)
 
-    res = SSB.run(1000, min_n_workers=1)
+    res = SSB.run(1000, min_n_workers=n_workers)
+    worker_pool.shutdown()
 
     ensemble_builder.join(10)
     if ensemble_builder.is_alive():
@@ -179,9 +179,8 @@ def get_info_from_file(datadir, dataset):
 ###############################
 
 import logging
-import re
 import tempfile
-from signal import SIGKILL, SIGTERM
+from signal import SIGKILL
 import sys
 import argparse
 
@@ -284,7 +283,6 @@ if __name__=="__main__" and debug_mode<4:
     import logic
     from multiprocessing import Process
     import shutil
-    import psutil
 
     ###############################
 
@@ -344,7 +342,11 @@ if __name__=="__main__" and debug_mode<4:
     tmp_output_dir = tempfile.mkdtemp(suffix="_" + dataname,
                                       dir=output_dir)
 
-    p = Process(target=logic.run_automl,
+    # The automl process and all processes it starts share a process group,
+    # which is what gets shut down afterwards
+    util.become_subreaper()
+    p = Process(target=util.run_in_new_process_group,
+                args=(logic.run_automl,),
                 kwargs={"args": args,
                         "logger": logger,
                         "input_dir": input_dir,
@@ -353,15 +355,13 @@ if __name__=="__main__" and debug_mode<4:
                         "tmp_output_dir": tmp_output_dir,
                         "budget": time_left_for_this_task,
                         "seed": 3,
-                        "sleep": 5})
+                        "sleep": 5,
+                        "n_workers": int(os.environ.get('N_WORKERS', 1))})
     p.start()
+    util.start_new_process_group(p.pid)
     p.join(time_left_for_this_task)
-    pid = p.pid
     if p.is_alive():
-        parent = psutil.Process(pid)
-        for child in parent.children(recursive=True):
-            child.kill()
-        parent.kill()
+        util.signal_process_group(p.pid, SIGKILL)
 
     # Start shutting down
     tmp = float(time.time())
@@ -374,14 +374,8 @@ if __name__=="__main__" and debug_mode<4:
 
     logger.info("Starting Shutdown!")
 
-    program_exp = re.compile(r"run\.py").search
-    contacts = util.send_signal_to_our_processes(sig=SIGTERM, filter=program_exp)
-    logger.debug("Sending SIG=%d to %s" % (SIGTERM, str(contacts)))
-
-    time.sleep(DELAY_TO_SIGKILL)
-
-    contacts = util.send_signal_to_our_processes(sig=SIGKILL, filter=program_exp)
-    logger.debug("Sending SIG=%d to %s" % (SIGKILL, str(contacts)))
+    signals = util.shutdown_process_group(p.pid, DELAY_TO_SIGKILL)
+    logger.debug("Sent SIG=%s to process group %d" % (signals, p.pid))
 
     logger.debug("Deleting %s" % tmp_output_dir)
     for i in range(5):
@@ -1,35 +1,85 @@
+import ctypes
 import os
+import signal
+import time
 
-import psutil
-import pwd
+MAX_POLL_INTERVAL = 0.5
+PR_SET_CHILD_SUBREAPER = 36
 
-def filter_pick(str_list, filter):
-    # iterates over list and checks for each entry, whether filter matches
-    match = list()
+
+def become_subreaper():
+    # Orphaned descendants are reparented to this process instead of init,
+    # which doesn't always reap them (e.g. in containers). Their zombies then
+    # leave the process group as soon as we wait for them. Only on Linux.
     try:
-        match = [l for l in str_list for m in (filter(l),) if m]
-    except IndexError:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
         return False
-    if len(match) == 1:
-        return True
-    else:
+
+
+def start_new_process_group(pid=0):
+    # Makes the process (0 for this one) the leader of a new process group.
+    # All processes it starts inherit the group, so the whole tree can be
+    # signalled at once without looking at the other processes on the host.
+    try:
+        os.setpgid(pid, pid)
+    except OSError:
+        # The process has already exited or moved to the group itself
+        pass
+
+
+def run_in_new_process_group(target, *args, **kwargs):
+    # Both the parent and the child call setpgid, so that no process can be
+    # started outside of the group and the parent can signal it right away
+    start_new_process_group()
+    return target(*args, **kwargs)
+
+
+def signal_process_group(pgid, sig):
+    # Returns whether there were processes left to receive sig
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
         return False
+    return True
+
+
+def _reap_process_group(pgid):
+    # Our children (and orphans, see become_subreaper) stay in the group as
+    # zombies until they are waited for
+    try:
+        while os.waitpid(-pgid, os.WNOHANG)[0] != 0:
+            pass
+    except ChildProcessError:
+        pass
+
+
+def wait_for_process_group(pgid, timeout):
+    # Returns whether all processes of the group exited within timeout
+    # seconds, polling less often the longer it takes
+    deadline = time.time() + timeout
+    interval = 0.01
+    while True:
+        _reap_process_group(pgid)
+        if not signal_process_group(pgid, 0):
+            return True
+        time_left = deadline - time.time()
+        if time_left <= 0:
+            return False
+        time.sleep(min(interval, time_left))
+        interval = min(2 * interval, MAX_POLL_INTERVAL)
 
 
-def send_signal_to_our_processes(filter, sig=0):
-    # Sends sig to all processes matching filter
-    contacts = list()
-    processes = psutil.process_iter()
-    this_process = psutil.Process()
-    for proc in processes:
-        try:
-            if proc.pid == this_process.pid:
-                continue
-            if proc.username() == pwd.getpwuid(os.getuid()).pw_name:
-                # = It is our process
-                if filter_pick(str_list=proc.cmdline(), filter=filter):
-                    proc.send_signal(sig)
-                    contacts.append(proc.pid)
-        except Exception as e:
-            print(e)
-    return contacts
\ No newline at end of file
+def shutdown_process_group(pgid, delay_to_sigkill):
+    # Sends SIGTERM to all processes of the group and SIGKILL to those left
+    # after delay_to_sigkill seconds, returns the signals that were sent as
+    # soon as all processes exited
+    signals = []
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        if not signal_process_group(pgid, sig):
+            break
+        signals.append(sig)
+        if wait_for_process_group(pgid, delay_to_sigkill):
+            break
+    return signals